@@ -0,0 +1,65 @@
+"""Microbenchmarks of RedshiftCalculator and DaytimeCalculator.
+
+Run from the repository root with ``python -m benchmarks.calculator``.
+"""
+
+import datetime as DT
+import timeit
+
+from custom_components.sunset.calculator import DaytimeCalculator, RedshiftCalculator
+
+PHASES = {
+    "day": DT.datetime(2020, 12, 13, 12, 0),
+    "evening": DT.datetime(2020, 12, 13, 20, 0),
+    "night": DT.datetime(2020, 12, 14, 3, 0),
+}
+
+RAMP_LENGTH = DT.timedelta(minutes=5)
+
+
+def calls_per_second(func) -> float:
+    number, seconds = timeit.Timer(func).autorange()
+    return number / seconds
+
+
+def nanoseconds_per_call(func) -> float:
+    return 1e9 / calls_per_second(func)
+
+
+def method_calls(at: DT.datetime) -> dict:
+    redshift = RedshiftCalculator()
+    daytime = DaytimeCalculator("00:00", "07:00")
+    return {
+        "RedshiftCalculator.color_temp": lambda: redshift.color_temp(at=at),
+        "RedshiftCalculator.is_day": lambda: redshift.is_day(at=at),
+        "RedshiftCalculator.is_night": lambda: redshift.is_night(at=at),
+        "RedshiftCalculator.next_change": lambda: redshift.next_change(at=at),
+        "RedshiftCalculator.ramp_segment": lambda: redshift.ramp_segment(RAMP_LENGTH, at=at),
+        "DaytimeCalculator.is_night": lambda: daytime.is_night(at=at),
+        "DaytimeCalculator.next_change": lambda: daytime.next_change(at=at),
+    }
+
+
+def main() -> None:
+    calculator = RedshiftCalculator()
+
+    construction = timeit.timeit(RedshiftCalculator, number=10) / 10
+    print(f"table construction: {construction * 1e3:.1f} ms")
+
+    computed = calls_per_second(calculator._computed_color_temp)
+    lookup = calls_per_second(calculator.color_temp)
+
+    print(f"computed color_temp: {computed:12,.0f} calls/s")
+    print(f"table color_temp:    {lookup:12,.0f} calls/s")
+    print(f"speedup:             {lookup / computed:12.1f}x")
+
+    print()
+    print(f"{'ns/call':34}" + "".join(f"{phase:>10}" for phase in PHASES))
+    results = {phase: method_calls(at) for phase, at in PHASES.items()}
+    for method in results["day"]:
+        timings = [nanoseconds_per_call(results[phase][method]) for phase in PHASES]
+        print(f"{method:34}" + "".join(f"{timing:10,.0f}" for timing in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Fixtures of the fleet benchmarks, see `benchmarks/test_fleet.py`."""
+
+import json
+import pathlib
+import time
+
+import pytest
+
+from tests.conftest import (  # noqa: F401
+    auto_enable_custom_integrations,
+    config_entry,
+    simulation,
+    start_at_noon,
+    turn_on_service,
+    turn_on_service_calls,
+)
+
+BASELINES = pathlib.Path(__file__).parent / "baselines.json"
+
+
+def _reference_workload() -> float:
+    start = time.process_time()
+    states = {f"light.light_{i}": 2500 + i * 37 % 3750 for i in range(20000)}
+    for _ in range(20):
+        sorted(states, key=states.__getitem__)
+    return time.process_time() - start
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("sunset benchmarks")
+    group.addoption(
+        "--benchmark-threshold",
+        type=float,
+        default=0.25,
+        help="relative regression over the baseline that fails a benchmark",
+    )
+    group.addoption(
+        "--update-baselines",
+        action="store_true",
+        help="store the measured values as new baselines",
+    )
+
+
+@pytest.fixture
+def expected_lingering_timers():
+    """Sunset's next tick is still scheduled when a benchmark ends."""
+    return True
+
+
+@pytest.fixture(scope="session")
+def reference_time():
+    """CPU time of a fixed workload, the unit the tick times are measured in."""
+    return min(_reference_workload() for _ in range(5))
+
+
+@pytest.fixture(scope="session")
+def baselines(request):
+    stored = json.loads(BASELINES.read_text()) if BASELINES.exists() else {}
+    measured = {}
+
+    yield stored, measured
+
+    if request.config.getoption("--update-baselines") and measured:
+        BASELINES.write_text(json.dumps(stored | measured, indent=4, sort_keys=True) + "\n")
+
+
+@pytest.fixture
+def check_baseline(request, baselines):
+    stored, measured = baselines
+    threshold = request.config.getoption("--benchmark-threshold")
+
+    def check(name, values):
+        measured[name] = values
+        if request.config.getoption("--update-baselines"):
+            return
+        baseline = stored.get(name)
+        if baseline is None:
+            pytest.fail(f"no baseline for {name}, run with --update-baselines")
+        regressions = [
+            f"{key}: {value:.6g} > {baseline[key]:.6g}"
+            for key, value in values.items()
+            if value > baseline[key] * (1 + threshold)
+        ]
+        assert not regressions, f"{name} regressed by more than {threshold:.0%}: " + (
+            ", ".join(regressions)
+        )
+
+    return check
@@ -0,0 +1,47 @@
+"""Benchmarks of Sunset on large light fleets.
+
+They are not part of the test suite, run them from the repository root with
+``pytest benchmarks``.  Each fleet runs through two hours of the evening ramp.
+The CPU time of all ticks, the service calls, the light commands and the peak
+memory are compared to ``benchmarks/baselines.json``, a regression of more than
+25% fails the benchmark.  The CPU time is measured in units of a fixed reference
+workload, so the baselines hold on machines of different speed.  Use ``--benchmark-threshold`` to change the threshold and
+``--update-baselines`` to store the measured values as new baselines.
+"""
+
+import datetime as DT
+import tracemalloc
+
+import pytest
+
+from tests.simulation import Fleet
+
+
+@pytest.mark.parametrize("size", [100, 1000, 5000])
+async def test_fleet_evening_ramp(
+    simulation, check_baseline, reference_time, record_property, size,
+):
+    fleet = Fleet(
+        color_temp_lights=size * 7 // 10,
+        dim_lights=size * 2 // 10,
+        bw_lights=size // 10,
+    )
+
+    tracemalloc.start()
+    try:
+        report = await simulation.async_run(
+            fleet,
+            start=DT.datetime(2020, 12, 13, 17, 0),
+            duration=DT.timedelta(hours=2),
+            step=DT.timedelta(seconds=30),
+        )
+    finally:
+        tracemalloc.stop()
+    record_property("summary", report.summary())
+
+    check_baseline(f"evening_ramp_{size}", {
+        "tick_time": sum(report.tick_durations) / reference_time,
+        "service_calls": report.service_calls,
+        "commands": sum(report.commands_per_light.values()),
+        "peak_memory": report.peak_memory,
+    })
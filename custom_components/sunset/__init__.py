@@ -1,40 +1,100 @@
+import asyncio
 import datetime as DT
 import logging
+import time
 from typing import Any
 
 import homeassistant.core as HA
 import homeassistant.helpers.event as EV
+import voluptuous as vol
 from homeassistant.components.light import (
     ATTR_BRIGHTNESS,
+    ATTR_BRIGHTNESS_PCT,
+    ATTR_BRIGHTNESS_STEP,
+    ATTR_BRIGHTNESS_STEP_PCT,
+    ATTR_COLOR_NAME,
     ATTR_COLOR_TEMP_KELVIN,
-    ATTR_MAX_COLOR_TEMP_KELVIN,
-    ATTR_MIN_COLOR_TEMP_KELVIN,
-    ATTR_SUPPORTED_COLOR_MODES,
-    COLOR_MODE_COLOR_TEMP,
-    COLOR_MODES_BRIGHTNESS,
+    ATTR_EFFECT,
+    ATTR_HS_COLOR,
+    ATTR_PROFILE,
+    ATTR_RGB_COLOR,
+    ATTR_RGBW_COLOR,
+    ATTR_RGBWW_COLOR,
+    ATTR_TRANSITION,
+    ATTR_WHITE,
+    ATTR_XY_COLOR,
 )
 from homeassistant.const import (
     ATTR_AREA_ID,
     ATTR_DEVICE_ID,
     ATTR_ENTITY_ID,
+    ATTR_FLOOR_ID,
+    ATTR_LABEL_ID,
     SERVICE_TURN_ON,
-    STATE_ON,
+    Platform,
 )
-from homeassistant.helpers import entity_registry
+from homeassistant.helpers import discovery
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.util import dt as dt_util
 from PIL.GifImagePlugin import TYPE_CHECKING
 
 if TYPE_CHECKING:
-    from collections.abc import Generator
+    from collections.abc import Generator, Iterable, Mapping
 
     from homeassistant.helpers.typing import ConfigType
 
 
-from .calculator import DaytimeCalculator, RedshiftCalculator
-
-DOMAIN = "sunset"
+from .burst import BurstDispatcher
+from .calculator import DaytimeCalculator, RampSegment, RedshiftCalculator
+from .command_queue import CommandQueue, Commands, Priority
+from .const import DOMAIN
+from .coordinator import TickCoordinator
+from .history import CommandHistory, CommandOutcome, CommandReason, CommandRecord
+from .intercept import async_intercept_service
+from .lights import KnownState, LightCapabilities, LightIndex, LightTargets
+from .profiler import TickProfiler
+from .sensor import SIGNAL_SENSORS_UPDATED, SensorValue
+from .stats import SkipReason, Statistics
+from .target import Target
 
 _LOGGER = logging.getLogger("sunset")
 
+DIRTY_LIGHT_DELAY = DT.timedelta(seconds=1)
+
+RETRY_DELAY = DT.timedelta(seconds=2)
+MAX_RETRY_DELAY = DT.timedelta(minutes=5)
+
+PROFILE_SCHEMA = vol.Schema({
+    vol.Optional("ticks", default=10): vol.All(vol.Coerce(int), vol.Range(min=1)),
+})
+
+_PRIORITY_REASONS = {
+    Priority.RAMP: CommandReason.RAMP,
+    Priority.USER: CommandReason.LIGHT_CHANGED,
+}
+
+_COLOR_ATTRS = {
+    ATTR_COLOR_NAME,
+    ATTR_COLOR_TEMP_KELVIN,
+    ATTR_EFFECT,
+    ATTR_HS_COLOR,
+    ATTR_PROFILE,
+    ATTR_RGB_COLOR,
+    ATTR_RGBW_COLOR,
+    ATTR_RGBWW_COLOR,
+    ATTR_WHITE,
+    ATTR_XY_COLOR,
+}
+
+_BRIGHTNESS_ATTRS = {
+    ATTR_BRIGHTNESS,
+    ATTR_BRIGHTNESS_PCT,
+    ATTR_BRIGHTNESS_STEP,
+    ATTR_BRIGHTNESS_STEP_PCT,
+    ATTR_PROFILE,
+    ATTR_WHITE,
+}
+
 
 async def async_setup(hass: HA.HomeAssistant, config: ConfigType) -> bool:
 
@@ -44,94 +104,256 @@ async def async_setup(hass: HA.HomeAssistant, config: ConfigType) -> bool:
     def brightness_inactive() -> bool:
         return hass.states.get(DOMAIN+".brightness_active").state != "True"
 
-    def fetch_light_states() -> dict[str, HA.State]:
-        return {
-            lgt: hass.states.get(lgt) for lgt in hass.states.async_entity_ids("light")
-            if hass.states.get(lgt).state == STATE_ON
-        }
-
-    def current_target_color_temp() -> int:
-        return manual_color_temp or round(redshift_calculator.color_temp())
-
-    def color_temp_in_limits(state: HA.State) -> int:
-        min_color_temp_kelvin = state.attributes[ATTR_MIN_COLOR_TEMP_KELVIN]
-        max_color_temp_kelvin = state.attributes[ATTR_MAX_COLOR_TEMP_KELVIN]
-        return min(
-            max_color_temp_kelvin,
-            max(min_color_temp_kelvin, current_target_color_temp()),
-        )
+    def current_target_color_temp(now: DT.datetime) -> int:
+        return manual_color_temp or round(redshift_calculator.color_temp(at=now))
 
-    def new_brightness() -> int | None:
+    def new_brightness(now: DT.datetime) -> int | None:
         if manual_brightness is not None:
             return manual_brightness
         if brightness_calculator is None:
             return None
-        if brightness_calculator.is_night():
+        if brightness_calculator.is_night(at=now):
             return final_config["night_brightness"]
         return 254
 
-    def forget_off_lights(current_states: dict[str, HA.State]) -> dict[str, HA.State]:
-        return {
-            lgt: state for lgt, state in known_states.items() if lgt in current_states
-        }
+    def current_ramp_segment(now: DT.datetime) -> RampSegment | None:
+        if not final_config["ramp_transition"] or manual_color_temp:
+            return None
+        return redshift_calculator.ramp_segment(
+            DT.timedelta(minutes=final_config["ramp_transition"]), at=now,
+        )
+
+    def color_temp_final(now: DT.datetime) -> bool:
+        return (
+            manual_color_temp is not None
+            or redshift_calculator.is_day(at=now)
+            or redshift_calculator.is_night(at=now)
+        )
+
+    def current_target() -> Target:
+        now = DT.datetime.now()
+        color_temp = current_target_color_temp(now)
+        return Target(
+            redshift_active=not redshift_inactive(),
+            brightness_active=not brightness_inactive(),
+            color_temp=color_temp,
+            color_temp_mired=int(1e6 / color_temp),
+            color_temp_final=color_temp_final(now),
+            brightness=new_brightness(now),
+            ramp_segment=current_ramp_segment(now),
+            time=now,
+        )
+
+    def forget_off_lights() -> None:
+        for lgt in light_index.pop_turned_off():
+            known_states.pop(lgt, None)
+            color_temp_directions.pop(lgt, None)
+            light_transitions.pop(lgt, None)
+            burst_dispatcher.discard(lgt)
+            command_queue.discard(lgt)
+            command_failures.pop(lgt, None)
+            retry_times.pop(lgt, None)
+
+    def lights_to_handle(target_changed: bool, now: DT.datetime) -> dict[str, Priority]:
+        for lgt, retry_time in list(retry_times.items()):
+            if retry_time <= now:
+                del retry_times[lgt]
+                light_index.mark_dirty(lgt)
+        dirty_lights = light_index.pop_dirty()
+        changed_lights = light_index.pop_changed()
+        lights = light_index.on_lights if target_changed else dirty_lights
+        priorities: dict[str, Priority] = {}
+        for lgt in lights:
+            if lgt in burst_dispatcher.pending:
+                statistics.record_skip(SkipReason.BURST_PENDING)
+            elif lgt in retry_times:
+                statistics.record_skip(SkipReason.RETRY_BACKOFF)
+            else:
+                priorities[lgt] = Priority.USER if lgt in changed_lights else Priority.RAMP
+        return priorities
+
+    def cancel_burst() -> None:
+        for lgt in burst_dispatcher.cancel():
+            known_states.pop(lgt, None)
+
+    def drop_queued_commands(lights: Iterable[str]) -> None:
+        for lgt in lights:
+            if command_queue.is_queued(lgt):
+                command_queue.discard(lgt)
+                known_states.pop(lgt, None)
+
+    def is_step_change(target: Target, previous: Target | None) -> bool:
+        if previous is None:
+            return True
+        if target.redshift_active and not previous.redshift_active:
+            return True
+        if target.brightness_active and not previous.brightness_active:
+            return True
+        if target.brightness != previous.brightness:
+            return True
+        if target.color_temp_mired == previous.color_temp_mired:
+            return False
+        return manual_color_temp is not None or (
+            redshift_calculator.is_day(at=target.time)
+            and not redshift_calculator.is_day(at=previous.time)
+        )
+
+    def prioritized_lights(lights: Iterable[str]) -> list[str]:
+        occupied = light_targets.lights_in_occupied_areas()
+        on_lights = light_index.on_lights
 
-    def is_not_color_temp_light(lgt: str) -> bool:
-        supported_modes = hass.states.get(lgt).attributes[ATTR_SUPPORTED_COLOR_MODES]
-        return COLOR_MODE_COLOR_TEMP not in supported_modes
+        def priority(lgt: str) -> tuple[bool, float]:
+            return lgt not in occupied, -on_lights[lgt].last_changed.timestamp()
 
-    def is_not_dimmable_light(lgt: str) -> bool:
-        supported_modes = hass.states.get(lgt).attributes[ATTR_SUPPORTED_COLOR_MODES]
-        return COLOR_MODES_BRIGHTNESS.isdisjoint(supported_modes)
+        return sorted(lights, key=priority)
+
+    def color_temp_held_back(
+        lgt: str, current_color_temp: int | None, color_temp_mired: int, final: bool,
+    ) -> SkipReason | None:
+        if current_color_temp is None:
+            return None
+
+        difference = color_temp_mired - current_color_temp
+        if difference == 0:
+            return SkipReason.CONVERGED
+        if final:
+            return None
+
+        step = final_config["color_temp_step"]
+        if abs(difference) < step:
+            return SkipReason.BELOW_STEP
+
+        last_direction = color_temp_directions.get(lgt)
+        if (
+            last_direction is not None
+            and difference * last_direction < 0
+            and abs(difference) < step + final_config["color_temp_hysteresis"]
+        ):
+            return SkipReason.HYSTERESIS
+
+        return None
 
     def new_color_temp_state(
-        lgt: str, known_state: HA.State | None, current_state: HA.State,
+        lgt: str,
+        known_state: KnownState | None,
+        current_state: HA.State,
+        target: Target,
+        with_transition: bool,
     ) -> dict[str, Any]:
-        known_color_temp = _color_temp_mired_of_state(known_state)
         current_color_temp = _color_temp_mired_of_state(current_state)
+        if known_state is not None:
+            current_color_temp = known_state.converged_color_temp_mired(
+                current_color_temp, final_config["color_temp_tolerance"],
+            )
 
-        light_was_on_before = known_state is not None
         somebody_changed_color_temp_since_last_time = (
-            known_color_temp != current_color_temp
+            light_index.color_temp_overridden(lgt)
+            and (known_state is None or known_state.color_temp_mired != current_color_temp)
         )
 
-        if is_not_color_temp_light(lgt):
+        capabilities = light_index.capabilities(lgt)
+        if not capabilities.color_temp:
             return {}
 
-        if somebody_changed_color_temp_since_last_time and light_was_on_before:
+        if target.ramp_segment is not None and light_in_transition(lgt, target):
+            color_temp_skips[lgt] = SkipReason.IN_TRANSITION
             return {}
 
-        state = hass.states.get(lgt)
-        color_temp = color_temp_in_limits(state)
-        current_color_temp_mired = _color_temp_mired_of_state(state)
+        if somebody_changed_color_temp_since_last_time:
+            return {}
 
-        if redshift_inactive() or int(1e6 / color_temp) == current_color_temp_mired:
+        if not target.redshift_active:
+            return {}
+
+        color_temp = capabilities.color_temp_in_limits(target.color_temp)
+        color_temp_mired = capabilities.color_temp_mired_in_limits(target.color_temp_mired)
+
+        segment = target.ramp_segment
+        if (
+            segment is not None
+            and with_transition
+            and capabilities.transition
+            and light_converged(known_state, current_color_temp, color_temp_mired)
+        ):
+            transition = int((segment.end - target.time).total_seconds())
+            if transition >= 1:
+                segment_color_temp = capabilities.color_temp_in_limits(segment.color_temp)
+                attrs = color_temp_command(
+                    lgt,
+                    current_color_temp,
+                    segment_color_temp,
+                    int(1e6 / segment_color_temp),
+                    segment.color_temp == final_config["night_color_temp"],
+                )
+                if attrs:
+                    light_transitions[lgt] = segment.end
+                    attrs[ATTR_TRANSITION] = transition
+                return attrs
+
+        return color_temp_command(
+            lgt, current_color_temp, color_temp, color_temp_mired, target.color_temp_final,
+        )
+
+    def light_converged(
+        known_state: KnownState | None, current_color_temp: int | None, color_temp_mired: int,
+    ) -> bool:
+        return (
+            known_state is not None
+            and current_color_temp is not None
+            and abs(current_color_temp - color_temp_mired) <= final_config["color_temp_tolerance"]
+        )
+
+    def color_temp_command(
+        lgt: str,
+        current_color_temp: int | None,
+        color_temp: int,
+        color_temp_mired: int,
+        final: bool,
+    ) -> dict[str, Any]:
+        held_back = color_temp_held_back(lgt, current_color_temp, color_temp_mired, final)
+        if held_back is not None:
+            color_temp_skips[lgt] = held_back
             return {}
 
+        if current_color_temp is not None:
+            color_temp_directions[lgt] = 1 if color_temp_mired > current_color_temp else -1
+
         _LOGGER.debug("color temp of %s -> %s", lgt, color_temp)
 
         return {ATTR_COLOR_TEMP_KELVIN: color_temp}
 
+    def light_in_transition(lgt: str, target: Target) -> bool:
+        transition_end = light_transitions.get(lgt)
+        if transition_end is None:
+            return False
+        if transition_end > target.time:
+            return True
+        del light_transitions[lgt]
+        return False
+
     def new_brightness_state(
-        lgt: str, known_state: HA.State | None, current_state: HA.State,
+        lgt: str,
+        known_state: KnownState | None,
+        current_state: HA.State,
+        target: Target,
     ) -> dict[str, Any]:
-        known_brightness = _brightness_of_state(known_state)
         current_brightness = _brightness_of_state(current_state)
 
-        light_was_on_before = known_state is not None
         somebody_changed_brightness_since_last_time = (
-            known_brightness != current_brightness
+            light_index.brightness_overridden(lgt)
+            and (known_state is None or known_state.brightness != current_brightness)
         )
 
-        if is_not_dimmable_light(lgt):
+        if not light_index.capabilities(lgt).dimmable:
             return {}
 
-        if somebody_changed_brightness_since_last_time and light_was_on_before:
+        if somebody_changed_brightness_since_last_time:
             return {}
 
-        brightness = current_brightness if brightness_inactive() else new_brightness()
+        brightness = target.brightness
 
         if (
-            brightness_inactive()
+            not target.brightness_active
             or brightness is None
             or brightness == current_brightness
         ):
@@ -141,78 +363,346 @@ async def async_setup(hass: HA.HomeAssistant, config: ConfigType) -> bool:
 
         return {ATTR_BRIGHTNESS: brightness}
 
-    async def maybe_apply_new_state(lgt: str, current_state: HA.State) -> None:
+    def plan_new_state(
+        lgt: str, current_state: HA.State, target: Target,
+    ) -> dict[str, Any]:
         if lgt in lights_not_to_touch:
-            return
+            statistics.record_skip(SkipReason.EXCLUDED)
+            return {}
 
         known_state = known_states.get(lgt)
 
+        brightness_attrs = new_brightness_state(lgt, known_state, current_state, target)
         attrs = new_color_temp_state(
-            lgt, known_state, current_state,
-        ) | new_brightness_state(lgt, known_state, current_state)
+            lgt, known_state, current_state, target, with_transition=not brightness_attrs,
+        ) | brightness_attrs
+        color_temp_skip = color_temp_skips.pop(lgt, SkipReason.CONVERGED)
 
-        if attrs:
-            current_attrs = current_state.attributes
-            call_attrs = {
-                key: current_attrs[key]
-                for key in [ATTR_BRIGHTNESS, ATTR_COLOR_TEMP_KELVIN]
-                if key in current_attrs
-            } | {ATTR_ENTITY_ID: lgt}
-            call_attrs.update(attrs)
-            known_attributes = known_state.attributes if known_state is not None else current_state.attributes
-            known_states[lgt] = HA.State(lgt, STATE_ON, known_attributes | attrs)
-            await hass.services.async_call("light", SERVICE_TURN_ON, call_attrs)
+        if not attrs:
+            statistics.record_skip(skip_reason(lgt, color_temp_skip))
+            return {}
+
+        current_attrs = current_state.attributes
+        call_attrs = {
+            key: current_attrs[key]
+            for key in [ATTR_BRIGHTNESS, ATTR_COLOR_TEMP_KELVIN]
+            if key in current_attrs
+        }
+        call_attrs.update(attrs)
+
+        if known_state is None:
+            known_state = KnownState(
+                _color_temp_mired_of_state(current_state),
+                _brightness_of_state(current_state),
+            )
+            known_states[lgt] = known_state
+        if ATTR_COLOR_TEMP_KELVIN in attrs:
+            known_state.command_color_temp(int(1e6 / attrs[ATTR_COLOR_TEMP_KELVIN]))
+        if ATTR_BRIGHTNESS in attrs:
+            known_state.brightness = attrs[ATTR_BRIGHTNESS]
+
+        return call_attrs
+
+    def skip_reason(lgt: str, color_temp_skip: SkipReason) -> SkipReason:
+        if light_index.color_temp_overridden(lgt) or light_index.brightness_overridden(lgt):
+            return SkipReason.OVERRIDDEN
+        if not light_index.capabilities(lgt).color_temp:
+            return SkipReason.NOT_COLOR_TEMP
+        return color_temp_skip
+
+    def plan_commands(
+        lights: list[str], target: Target,
+    ) -> Commands:
+        commands: Commands = {}
+        for lgt in lights:
+            current_state = light_index.on_lights.get(lgt)
+            if current_state is None:
+                continue
+            call_attrs = plan_new_state(lgt, current_state, target)
+            if call_attrs:
+                commands.setdefault(tuple(sorted(call_attrs.items())), []).append(lgt)
+        return commands
+
+    async def send_command(
+        attrs: dict[str, Any], lgts: list[str], reasons: Mapping[str, CommandReason],
+    ) -> None:
+        async with command_semaphore:
+            statistics.record_service_call(len(lgts))
+            sent = dt_util.now()
+            start = time.monotonic()
+            outcome = CommandOutcome.OK
+            try:
+                async with asyncio.timeout(final_config["command_timeout"]):
+                    await hass.services.async_call(
+                        "light",
+                        SERVICE_TURN_ON,
+                        attrs | {ATTR_ENTITY_ID: lgts},
+                        blocking=True,
+                        context=HA.Context(parent_id=sunset_context.id),
+                    )
+            except TimeoutError:
+                outcome = CommandOutcome.TIMEOUT
+                _LOGGER.warning("Timeout turning on %s", ", ".join(lgts))
+            except Exception as exc:  # noqa: BLE001
+                outcome = CommandOutcome.FAILED
+                _LOGGER.warning("Failed to turn on %s: %s", ", ".join(lgts), exc)
+            latency = time.monotonic() - start
+            if outcome is CommandOutcome.OK:
+                statistics.record_command_latency(latency)
+                for lgt in lgts:
+                    command_failures.pop(lgt, None)
+            else:
+                retry_later(lgts)
+            record_commands(attrs, lgts, reasons, outcome, latency, sent)
+            for lgt in lgts:
+                burst_dispatcher.finished(lgt)
+
+    def retry_later(lgts: list[str]) -> None:
+        now = DT.datetime.now()
+        for lgt in lgts:
+            known_states.pop(lgt, None)
+            failures = command_failures.get(lgt, 0) + 1
+            command_failures[lgt] = failures
+            retry_times[lgt] = now + min(RETRY_DELAY * 2 ** (failures - 1), MAX_RETRY_DELAY)
+        schedule_tick_before(min(retry_times.values()))
+
+    def record_commands(
+        attrs: dict[str, Any],
+        lgts: list[str],
+        reasons: Mapping[str, CommandReason],
+        outcome: CommandOutcome,
+        latency: float,
+        sent: DT.datetime,
+    ) -> None:
+        for lgt in lgts:
+            command_history.record(CommandRecord(
+                time=sent,
+                entity_id=lgt,
+                color_temp_kelvin=attrs.get(ATTR_COLOR_TEMP_KELVIN),
+                brightness=attrs.get(ATTR_BRIGHTNESS),
+                reason=reasons.get(lgt),
+                outcome=outcome,
+                latency=latency,
+            ))
+
+    async def send_spread_command(lgt: str) -> bool:
+        commands = plan_commands([lgt], current_target())
+        await command_queue.async_enqueue(commands, {lgt: CommandReason.STEP_CHANGE})
+        return bool(commands)
+
+    async def apply_commands(
+        commands: Commands, reasons: Mapping[str, CommandReason],
+    ) -> None:
+        for attrs, lgts in commands.items():
+            hass.async_create_task(
+                send_command(dict(attrs), lgts, reasons), "sunset light command",
+            )
+
+    def next_tick_time(now: DT.datetime) -> DT.datetime:
+        changes = [redshift_calculator.next_change(final_config["color_temp_step"], at=now)]
+        if brightness_calculator is not None:
+            changes.append(brightness_calculator.next_change(at=now))
+        if light_index.has_dirty:
+            changes.append(now + DIRTY_LIGHT_DELAY)
+        if retry_times:
+            changes.append(min(retry_times.values()))
+        return max(min(changes), now + DIRTY_LIGHT_DELAY)
+
+    @HA.callback
+    def publish_sensors(target: Target) -> None:
+        now = target.time
+        brightness_change = (
+            brightness_calculator.next_change(at=now).astimezone()
+            if brightness_calculator is not None
+            else None
+        )
+        color_temp_change = redshift_calculator.next_change(
+            final_config["color_temp_step"], at=now,
+        )
+        hass.data[DOMAIN] |= {
+            "color_temp_kelvin": SensorValue(target.color_temp, color_temp_change.astimezone()),
+            "brightness": SensorValue(target.brightness, brightness_change),
+        }
+        async_dispatcher_send(hass, SIGNAL_SENSORS_UPDATED)
+
+    @HA.callback
+    def schedule_tick(when: DT.datetime) -> None:
+        nonlocal cancel_scheduled_tick, scheduled_tick_time
+        if cancel_scheduled_tick is not None:
+            cancel_scheduled_tick()
+        scheduled_tick_time = when
+        cancel_scheduled_tick = EV.async_track_point_in_time(
+            hass, scheduled_tick, when.astimezone(),
+        )
 
-    async def timer_event(_: DT.datetime | None) -> None:
-        nonlocal known_states
+    @HA.callback
+    def schedule_tick_soon() -> None:
+        schedule_tick_before(DT.datetime.now() + DIRTY_LIGHT_DELAY)
+
+    @HA.callback
+    def schedule_tick_before(when: DT.datetime) -> None:
+        if scheduled_tick_time is None or scheduled_tick_time > when:
+            schedule_tick(when)
+
+    async def scheduled_tick(_: DT.datetime) -> None:
+        nonlocal cancel_scheduled_tick, scheduled_tick_time
+        cancel_scheduled_tick = None
+        scheduled_tick_time = None
+        await tick_coordinator.async_request_tick()
+
+    @HA.callback
+    def active_state_changed(_: HA.Event[HA.EventStateChangedData]) -> None:
+        schedule_tick_soon()
+
+    async def timer_event() -> None:
+        nonlocal last_target
+
+        start = time.monotonic()
+        target = current_target()
+
+        publish_sensors(target)
+
+        async with planning_lock:
+            forget_off_lights()
+
+            target_changed = target != last_target
+            step_change = (
+                final_config["burst_window"] > 0 and is_step_change(target, last_target)
+            )
+            last_target = target
+
+            if step_change:
+                cancel_burst()
+
+            lights = lights_to_handle(target_changed, target.time)
+            drop_queued_commands(lights)
+
+            if step_change:
+                await burst_dispatcher.async_spread(
+                    prioritized_lights(lights),
+                    DT.timedelta(seconds=final_config["burst_window"]),
+                )
+            else:
+                commands = plan_commands(list(lights), target)
+                reasons = {lgt: _PRIORITY_REASONS[priority] for lgt, priority in lights.items()}
+                await command_queue.async_enqueue(commands, reasons, lights)
+
+        schedule_tick(next_tick_time(target.time))
+
+        statistics.record_tick(time.monotonic() - start, len(lights))
+
+    async def profiled_timer_event() -> None:
+        await tick_profiler.async_run(timer_event)
+
+    @HA.callback
+    def light_overridden(lgt: str) -> None:
+        if lgt in burst_dispatcher.pending:
+            burst_dispatcher.discard(lgt)
+            known_states.pop(lgt, None)
+
+    async def command_turned_on_light(lgt: str) -> None:
+        async with planning_lock:
+            forget_off_lights()
+            if lgt in burst_dispatcher.pending or lgt in retry_times:
+                return
+            drop_queued_commands([lgt])
+            commands = plan_commands([lgt], current_target())
+            await command_queue.async_enqueue(
+                commands, {lgt: CommandReason.TURN_ON}, {lgt: Priority.USER},
+            )
+
+    @HA.callback
+    def light_turned_on(lgt: str) -> None:
+        if final_config["turn_on_fast_path"]:
+            hass.async_create_task(command_turned_on_light(lgt), "sunset turn on fast path")
+
+    @HA.callback
+    def turn_on_target_attrs(data: Mapping[str, Any]) -> dict[str, Any]:
+        lgts = set(entity_ids_of_targets(data))
+        if (
+            not lgts
+            or not lgts.isdisjoint(light_index.on_lights)
+            or not lgts.isdisjoint(lights_not_to_touch)
+        ):
+            return {}
 
-        hass.states.async_set(DOMAIN + ".color_temp_kelvin", current_target_color_temp())
-        hass.states.async_set(DOMAIN + ".brightness", new_brightness())
+        states = [hass.states.get(lgt) for lgt in lgts]
+        if None in states:
+            return {}
+        capabilities = [LightCapabilities.from_attributes(state.attributes) for state in states]
 
-        current_states = fetch_light_states()
-        known_states = forget_off_lights(current_states)
+        target = current_target()
+        attrs: dict[str, Any] = {}
 
-        for lgt, current_state in current_states.items():
-            await maybe_apply_new_state(lgt, current_state)
+        if (
+            target.redshift_active
+            and _COLOR_ATTRS.isdisjoint(data)
+            and all(capability.color_temp for capability in capabilities)
+        ):
+            color_temps = {
+                capability.color_temp_in_limits(target.color_temp)
+                for capability in capabilities
+            }
+            if len(color_temps) == 1:
+                attrs[ATTR_COLOR_TEMP_KELVIN] = color_temps.pop()
+
+        if (
+            target.brightness_active
+            and target.brightness is not None
+            and _BRIGHTNESS_ATTRS.isdisjoint(data)
+            and all(capability.dimmable for capability in capabilities)
+        ):
+            attrs[ATTR_BRIGHTNESS] = target.brightness
 
+        if attrs:
+            _LOGGER.debug("turning on %s with %s", ", ".join(sorted(lgts)), attrs)
+
+        return attrs
+
+    @HA.callback
     def dont_touch(event: HA.Event) -> None:
-        for entity_id in entity_ids_from_event(event):
+        for entity_id in entity_ids_of_targets(event.data):
             lights_not_to_touch.add(entity_id)
 
+    @HA.callback
     def handle_again(event: HA.Event) -> None:
-        for entity_id in entity_ids_from_event(event):
+        for entity_id in entity_ids_of_targets(event.data):
             if entity_id not in lights_not_to_touch:
                 _LOGGER.warning("Unknown entity_id: %s", entity_id)
                 continue
             lights_not_to_touch.remove(entity_id)
-
-    def entity_ids_from_event(event: HA.Event) -> Generator[str]:
-        entity_reg = entity_registry.async_get(hass)
-
-        device_id = event.data.get(ATTR_DEVICE_ID)
-        if device_id is not None:
-            for entry in entity_registry.async_entries_for_device(
-                entity_reg, device_id,
-            ):
-                yield entry.entity_id
-
-        area_id = event.data.get(ATTR_AREA_ID)
-        if area_id is not None:
-            for entry in entity_registry.async_entries_for_area(entity_reg, area_id):
-                yield entry.entity_id
-
-        entity_ids = event.data.get(ATTR_ENTITY_ID, [])
-        if isinstance(entity_ids, str):
-            entity_ids = [entity_ids]
-
-        yield from entity_ids
+            light_index.mark_dirty(entity_id)
+
+    @HA.callback
+    def diagnostics(_: HA.ServiceCall) -> dict[str, Any]:
+        return statistics.as_dict() | {"ticks": tick_coordinator.counts()}
+
+    @HA.callback
+    def dump_history(_: HA.ServiceCall) -> dict[str, Any]:
+        return {"commands": command_history.as_list()}
+
+    @HA.callback
+    def profile(call: HA.ServiceCall) -> dict[str, Any]:
+        ticks = call.data["ticks"]
+        path = hass.config.path(f"sunset_profile_{dt_util.now():%Y%m%d_%H%M%S}.prof")
+        tick_profiler.arm(ticks, path)
+        _LOGGER.info("Profiling the next %s ticks into %s", ticks, path)
+        return {"path": path}
+
+    def entity_ids_of_targets(data: Mapping[str, Any]) -> Generator[str]:
+        yield from light_targets.lights_of_devices(_as_list(data.get(ATTR_DEVICE_ID)))
+        yield from light_targets.lights_of_areas(_as_list(data.get(ATTR_AREA_ID)))
+        yield from light_targets.lights_of_floors(_as_list(data.get(ATTR_FLOOR_ID)))
+        yield from light_targets.lights_of_labels(_as_list(data.get(ATTR_LABEL_ID)))
+        yield from _as_list(data.get(ATTR_ENTITY_ID))
 
     async def deactivate_redshift(event: HA.Event) -> None:
         nonlocal manual_color_temp
         manual_color_temp = event.data.get("color_temp")
+        cancel_burst()
 
         if manual_color_temp is not None:
-            await timer_event(None)
+            await tick_coordinator.async_request_tick()
 
         states = hass.states
         hass.states.async_set(DOMAIN + ".redshift_active", False)
@@ -221,20 +711,21 @@ async def async_setup(hass: HA.HomeAssistant, config: ConfigType) -> bool:
         nonlocal manual_color_temp
         manual_color_temp = None
         hass.states.async_set(DOMAIN + ".redshift_active", True)
-        await timer_event(None)
+        await tick_coordinator.async_request_tick()
 
     async def deactivate_brightness(event: HA.Event) -> None:
         nonlocal manual_brightness
         manual_brightness = event.data.get("brightness")
+        cancel_burst()
         if manual_brightness is not None:
-            await timer_event(None)
+            await tick_coordinator.async_request_tick()
         hass.states.async_set(DOMAIN + ".brightness_active", False)
 
     async def activate_brightness(event) -> None:
         nonlocal manual_brightness
         manual_brightness = None
         hass.states.async_set(DOMAIN + ".brightness_active", True)
-        await timer_event(None)
+        await tick_coordinator.async_request_tick()
 
     def finalized_config() -> dict[str, Any]:
         final_config = {
@@ -245,6 +736,18 @@ async def async_setup(hass: HA.HomeAssistant, config: ConfigType) -> bool:
             "day_color_temp": 6250,
             "night_color_temp": 2500,
             "night_brightness": 127,
+            "color_temp_step": 1,
+            "color_temp_hysteresis": 0,
+            "color_temp_tolerance": 10,
+            "ramp_transition": 0,
+            "max_concurrent_commands": 8,
+            "command_timeout": 10,
+            "burst_window": 0,
+            "command_rates": {},
+            "turn_on_fast_path": False,
+            "intercept_turn_on": False,
+            "diagnostic_sensors": False,
+            "command_history_size": 256,
         }
         final_config.update(config[DOMAIN])
         return final_config
@@ -268,42 +771,110 @@ async def async_setup(hass: HA.HomeAssistant, config: ConfigType) -> bool:
     redshift_calculator = make_redshift_calculator()
     brightness_calculator = make_brightness_calculator()
 
-    known_states: dict[str, HA.State] = {}
+    known_states: dict[str, KnownState] = {}
+    last_target: Target | None = None
+    color_temp_directions: dict[str, int] = {}
+    light_transitions: dict[str, DT.datetime] = {}
+    command_failures: dict[str, int] = {}
+    retry_times: dict[str, DT.datetime] = {}
+    color_temp_skips: dict[str, SkipReason] = {}
 
     manual_color_temp: int | None = None
     manual_brightness: int | None = None
 
     lights_not_to_touch: set[str] = set()
 
+    cancel_scheduled_tick: HA.CALLBACK_TYPE | None = None
+    scheduled_tick_time: DT.datetime | None = None
+
+    sunset_context = HA.Context()
+    command_semaphore = asyncio.Semaphore(final_config["max_concurrent_commands"])
+    planning_lock = asyncio.Lock()
+
+    statistics = Statistics()
+    command_history = CommandHistory(final_config["command_history_size"])
+    hass.data[DOMAIN] = {"statistics": statistics}
+
+    tick_profiler = TickProfiler(hass)
+    tick_coordinator = TickCoordinator(profiled_timer_event)
+
+    light_index = LightIndex(
+        hass,
+        on_dirty=schedule_tick_soon,
+        on_turned_on=light_turned_on,
+        on_overridden=light_overridden,
+        own_context=sunset_context,
+    )
+    light_index.async_start()
+
+    light_targets = LightTargets(hass)
+    light_targets.async_start()
+
+    command_queue = CommandQueue(hass, apply_commands, final_config["command_rates"])
+    burst_dispatcher = BurstDispatcher(hass, send_spread_command)
+
     hass.services.async_register(DOMAIN, "dont_touch", dont_touch)
     hass.services.async_register(DOMAIN, "handle_again", handle_again)
     hass.services.async_register(DOMAIN, "activate_redshift", activate_redshift)
     hass.services.async_register(DOMAIN, "deactivate_redshift", deactivate_redshift)
     hass.services.async_register(DOMAIN, "activate_brightness", activate_brightness)
     hass.services.async_register(DOMAIN, "deactivate_brightness", deactivate_brightness)
+    hass.services.async_register(
+        DOMAIN, "diagnostics", diagnostics, supports_response=HA.SupportsResponse.ONLY,
+    )
+    hass.services.async_register(
+        DOMAIN, "dump_history", dump_history, supports_response=HA.SupportsResponse.ONLY,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        "profile",
+        profile,
+        schema=PROFILE_SCHEMA,
+        supports_response=HA.SupportsResponse.OPTIONAL,
+    )
 
     hass.states.async_set(DOMAIN + ".redshift_active", True)
     hass.states.async_set(DOMAIN + ".brightness_active", True)
 
-    hass.states.async_set(DOMAIN + ".color_temp_kelvin", current_target_color_temp())
-    hass.states.async_set(DOMAIN + ".brightness", new_brightness())
-
-    EV.async_track_time_interval(hass, timer_event, DT.timedelta(seconds=1))
+    if final_config["intercept_turn_on"]:
+        async_intercept_service(hass, "light", SERVICE_TURN_ON, turn_on_target_attrs)
+
+    initial_target = current_target()
+    publish_sensors(initial_target)
+    hass.async_create_task(
+        discovery.async_load_platform(
+            hass,
+            Platform.SENSOR,
+            DOMAIN,
+            {"diagnostic_sensors": final_config["diagnostic_sensors"]},
+            config,
+        ),
+    )
+
+    EV.async_track_state_change_event(
+        hass,
+        [DOMAIN + ".redshift_active", DOMAIN + ".brightness_active"],
+        active_state_changed,
+    )
+    schedule_tick(next_tick_time(initial_target.time))
 
     return True
 
 
-def _color_temp_mired_of_state(state: HA.State | None) -> int | None:
-    if state is None:
-        return None
+def _color_temp_mired_of_state(state: HA.State) -> int | None:
     color_temp = state.attributes.get(ATTR_COLOR_TEMP_KELVIN)
     if color_temp is None:
         return None
     return int(1e6 / color_temp)
 
 
-def _brightness_of_state(state: HA.State | None) -> int | None:
-    if state is None:
-        return None
-
+def _brightness_of_state(state: HA.State) -> int | None:
     return state.attributes.get(ATTR_BRIGHTNESS)
+
+
+def _as_list(value: str | list[str] | None) -> list[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return value
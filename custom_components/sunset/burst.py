@@ -0,0 +1,73 @@
+import datetime as DT
+from typing import TYPE_CHECKING
+
+import homeassistant.core as HA
+import homeassistant.helpers.event as EV
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable, Collection
+
+
+class BurstDispatcher:
+
+    def __init__(
+            self,
+            hass: HA.HomeAssistant,
+            send: Callable[[str], Awaitable[bool]],
+    ) -> None:
+        self._hass = hass
+        self._send = send
+        self._pending: dict[str, bool] = {}
+        self._interval = 0.0
+        self._cancel_timer: HA.CALLBACK_TYPE | None = None
+
+    @property
+    def pending(self) -> Collection[str]:
+        return self._pending.keys()
+
+    async def async_spread(self, lights: list[str], window: DT.timedelta) -> None:
+        if not lights:
+            return
+
+        self._pending.update(dict.fromkeys(lights, False))
+        self._interval = window.total_seconds() / len(self._pending)
+        await self._send_next_light()
+        if self._cancel_timer is None and self._waiting():
+            self._schedule_next()
+
+    def finished(self, lgt: str) -> None:
+        if self._pending.get(lgt):
+            del self._pending[lgt]
+
+    def discard(self, lgt: str) -> None:
+        self._pending.pop(lgt, None)
+
+    def cancel(self) -> list[str]:
+        if self._cancel_timer is not None:
+            self._cancel_timer()
+            self._cancel_timer = None
+        cancelled, self._pending = list(self._pending), {}
+        return cancelled
+
+    def _waiting(self) -> bool:
+        return not all(self._pending.values())
+
+    def _schedule_next(self) -> None:
+        self._cancel_timer = EV.async_call_later(
+            self._hass, self._interval, self._send_next,
+        )
+
+    async def _send_next(self, _: DT.datetime) -> None:
+        self._cancel_timer = None
+        await self._send_next_light()
+        if self._cancel_timer is None and self._waiting():
+            self._schedule_next()
+
+    async def _send_next_light(self) -> None:
+        for lgt, in_flight in list(self._pending.items()):
+            if in_flight or lgt not in self._pending:
+                continue
+            self._pending[lgt] = True
+            if await self._send(lgt):
+                return
+            self._pending.pop(lgt, None)
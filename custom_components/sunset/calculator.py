@@ -1,6 +1,15 @@
 
 
 import datetime as DT
+from array import array
+from typing import NamedTuple
+
+_SECONDS_PER_DAY = 24 * 60 * 60
+
+
+class RampSegment(NamedTuple):
+    end: DT.datetime
+    color_temp: int
 
 
 class DaytimeCalculator:
@@ -9,25 +18,34 @@ class DaytimeCalculator:
         self._night_time: DT.time = DT.time.fromisoformat(night_time)
         self._morning_time = DT.time.fromisoformat(morning_time)
 
-    def is_night(self) -> bool:
-        return DT.datetime.now() > self._night_start()
+    def is_night(self, at: DT.datetime | None = None) -> bool:
+        now = at or DT.datetime.now()
+        return now > self._night_start(now)
+
+    def next_change(self, at: DT.datetime | None = None) -> DT.datetime:
+        now = at or DT.datetime.now()
+        if self.is_night(now):
+            return self._next_morning(now)
+        return self._night_start(now)
 
-    def _night_start(self) -> DT.datetime:
-        return self._time_corrected(self._night_time)
+    def _night_start(self, now: DT.datetime) -> DT.datetime:
+        return self._time_corrected(self._night_time, now)
 
-    def _morning(self) -> DT.datetime:
-        return self._today_time(self._morning_time)
+    def _morning(self, now: DT.datetime) -> DT.datetime:
+        return DT.datetime.combine(now, self._morning_time)
 
-    def _today_time(self, time: DT.time) -> DT.datetime:
-        today = DT.datetime.today()
-        return DT.datetime.combine(today, time)
+    def _next_morning(self, now: DT.datetime) -> DT.datetime:
+        morning = self._morning(now)
+        if morning <= now:
+            return morning + DT.timedelta(days=1)
+        return morning
 
-    def _time_corrected(self, time: DT.time) -> DT.datetime:
-        today_time = self._today_time(time)
-        morning = self._morning()
-        if today_time > morning and DT.datetime.now() < morning:
+    def _time_corrected(self, time: DT.time, now: DT.datetime) -> DT.datetime:
+        today_time = DT.datetime.combine(now, time)
+        morning = self._morning(now)
+        if today_time > morning and now < morning:
             return today_time - DT.timedelta(days=1)
-        if today_time < morning and DT.datetime.now() > morning:
+        if today_time < morning and now > morning:
             return today_time + DT.timedelta(days=1)
         return today_time
 
@@ -48,26 +66,115 @@ class RedshiftCalculator(DaytimeCalculator):
         self._evening_time: DT.time = DT.time.fromisoformat(evening_time)
         super().__init__(night_time, morning_time)
 
-    def is_day(self):
-        return DT.datetime.now() < self._evening_start()
+        self._color_temp_table = self._make_color_temp_table()
 
-    def color_temp(self) -> int:
-        if self.is_night():
+    def is_day(self, at: DT.datetime | None = None) -> bool:
+        now = at or DT.datetime.now()
+        return now < self._evening_start(now)
+
+    def color_temp(self, at: DT.datetime | None = None) -> int:
+        now = at or DT.datetime.now()
+        return self._color_temp_table[now.hour * 3600 + now.minute * 60 + now.second]
+
+    def _computed_color_temp(self, at: DT.datetime | None = None) -> int:
+        now = at or DT.datetime.now()
+        if self.is_night(now):
             return self._night_color_temp
 
-        if self.is_day():
+        if self.is_day(now):
             return self._day_color_temp
 
-        return self._interpolated_color_temp()
+        return self._interpolated_color_temp(now)
+
+    def next_change(
+            self, min_mired_step: int = 1, at: DT.datetime | None = None,
+    ) -> DT.datetime:
+        now = at or DT.datetime.now()
+        if self.is_night(now):
+            return self._next_morning(now)
+
+        if self.is_day(now):
+            return self._evening_start(now)
+
+        return self._next_evening_step(min_mired_step, now)
+
+    def ramp_segment(
+            self, length: DT.timedelta, at: DT.datetime | None = None,
+    ) -> RampSegment | None:
+        now = at or DT.datetime.now()
+        if self.is_night(now) or self.is_day(now):
+            return None
+
+        evening_start = self._evening_start(now)
+        night_start = self._night_start(now)
+        end = min(now + length, night_start)
+
+        evening_time_span = (night_start - evening_start).seconds
+        time_into_evening = (end - evening_start).seconds
+
+        return RampSegment(
+            end, self._color_temp_into_evening(time_into_evening, evening_time_span),
+        )
+
+    def _interpolated_color_temp(self, now: DT.datetime) -> int:
+        evening_start = self._evening_start(now)
+        evening_time_span = (self._night_start(now) - evening_start).seconds
+        time_into_evening = (now - evening_start).seconds
 
-    def _interpolated_color_temp(self) -> int:
-        evening_time_span = (self._night_start() - self._evening_start()).seconds
-        time_into_evening = (DT.datetime.now() - self._evening_start()).seconds
+        return self._color_temp_into_evening(time_into_evening, evening_time_span)
 
+    def _color_temp_into_evening(
+            self, time_into_evening: int, evening_time_span: int,
+    ) -> int:
         color_range = self._night_color_temp - self._day_color_temp
 
         color = self._day_color_temp + color_range / evening_time_span * time_into_evening
         return round(color)
 
-    def _evening_start(self):
-        return self._time_corrected(self._evening_time)
+    def _make_color_temp_table(self) -> array[int]:
+        morning = _second_of_day(self._morning_time)
+        evening = (_second_of_day(self._evening_time) - morning) % _SECONDS_PER_DAY
+        night = (_second_of_day(self._night_time) - morning) % _SECONDS_PER_DAY
+
+        table = array("H", [self._day_color_temp]) * min(evening, night)
+        table.extend(
+            self._color_temp_into_evening(seconds, night - evening)
+            for seconds in range(night - evening)
+        )
+        table.extend(array("H", [self._night_color_temp]) * (_SECONDS_PER_DAY - night))
+
+        return table[-morning:] + table[:-morning] if morning else table
+
+    def _next_evening_step(self, min_mired_step: int, now: DT.datetime) -> DT.datetime:
+        evening_start = self._evening_start(now)
+        evening_time_span = (self._night_start(now) - evening_start).seconds
+        time_into_evening = (now - evening_start).seconds
+
+        def mired_at(seconds: int) -> int:
+            return _mired(self._color_temp_into_evening(seconds, evening_time_span))
+
+        mired = mired_at(time_into_evening)
+
+        if self._night_color_temp == self._day_color_temp:
+            return self._night_start(now)
+
+        first, last = time_into_evening + 1, evening_time_span
+        while first < last:
+            middle = (first + last) // 2
+            if abs(mired_at(middle) - mired) < min_mired_step:
+                first = middle + 1
+            else:
+                last = middle
+
+        return evening_start + DT.timedelta(seconds=first)
+
+    def _evening_start(self, now: DT.datetime) -> DT.datetime:
+        return self._time_corrected(self._evening_time, now)
+
+
+def _mired(color_temp: int) -> int:
+    return int(1e6 / color_temp)
+
+
+def _second_of_day(time: DT.time) -> int:
+    return time.hour * 3600 + time.minute * 60 + time.second
@@ -0,0 +1,139 @@
+import datetime as DT
+import time
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import TYPE_CHECKING, Any
+
+import homeassistant.core as HA
+import homeassistant.helpers.event as EV
+from homeassistant.helpers import entity_registry
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable, Mapping
+
+    from .history import CommandReason
+
+type Commands = dict[tuple[tuple[str, Any], ...], list[str]]
+
+
+class Priority(IntEnum):
+    RAMP = 0
+    USER = 1
+
+
+@dataclass(slots=True)
+class TokenBucket:
+    rate: float
+    capacity: float
+    tokens: float
+    updated: float
+
+    @classmethod
+    def full(cls, rate: float) -> TokenBucket:
+        capacity = max(rate, 1.0)
+        return cls(rate, capacity, capacity, time.monotonic())
+
+    def available(self) -> int:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return int(self.tokens)
+
+    def take(self, count: int) -> None:
+        self.tokens -= count
+
+    def seconds_until_token(self) -> float:
+        return max(0.0, (1.0 - self.tokens) / self.rate)
+
+
+class CommandQueue:
+
+    def __init__(
+            self,
+            hass: HA.HomeAssistant,
+            send: Callable[[Commands, Mapping[str, CommandReason]], Awaitable[None]],
+            rates: Mapping[str, float],
+    ) -> None:
+        self._hass = hass
+        self._send = send
+        self._buckets = {
+            platform: TokenBucket.full(rate) for platform, rate in rates.items()
+        }
+        self._queued: dict[
+            str, dict[str, tuple[Priority, dict[str, Any], CommandReason | None]]
+        ] = {platform: {} for platform in rates}
+        self._platforms: dict[str, str] = {}
+        self._cancel_timers: dict[str, HA.CALLBACK_TYPE] = {}
+
+    def is_queued(self, lgt: str) -> bool:
+        platform = self._platforms.get(lgt)
+        return platform is not None and lgt in self._queued[platform]
+
+    def discard(self, lgt: str) -> None:
+        platform = self._platforms.pop(lgt, None)
+        if platform is not None:
+            self._queued[platform].pop(lgt, None)
+
+    async def async_enqueue(
+            self,
+            commands: Commands,
+            reasons: Mapping[str, CommandReason] | None = None,
+            priorities: Mapping[str, Priority] | None = None,
+    ) -> None:
+        reasons = reasons or {}
+        priorities = priorities or {}
+        immediate: Commands = {}
+        immediate_reasons: dict[str, CommandReason] = {}
+        touched_platforms = set()
+        for attrs, lgts in commands.items():
+            for lgt in lgts:
+                reason = reasons.get(lgt)
+                platform = self._platform_of(lgt)
+                if platform not in self._buckets:
+                    immediate.setdefault(attrs, []).append(lgt)
+                    if reason is not None:
+                        immediate_reasons[lgt] = reason
+                    continue
+                self._platforms[lgt] = platform
+                priority = priorities.get(lgt, Priority.RAMP)
+                self._queued[platform][lgt] = (priority, dict(attrs), reason)
+                touched_platforms.add(platform)
+
+        for platform in touched_platforms:
+            self._drain(platform)
+
+        if immediate:
+            await self._send(immediate, immediate_reasons)
+
+    def _platform_of(self, lgt: str) -> str | None:
+        entry = entity_registry.async_get(self._hass).async_get(lgt)
+        return entry.platform if entry is not None else None
+
+    def _drain(self, platform: str) -> None:
+        queued = self._queued[platform]
+        bucket = self._buckets[platform]
+
+        count = min(bucket.available(), len(queued))
+        if count > 0:
+            bucket.take(count)
+            by_priority = sorted(queued, key=lambda lgt: queued[lgt][0], reverse=True)
+            commands: Commands = {}
+            reasons: dict[str, CommandReason] = {}
+            for lgt in by_priority[:count]:
+                _, attrs, reason = queued.pop(lgt)
+                del self._platforms[lgt]
+                commands.setdefault(tuple(sorted(attrs.items())), []).append(lgt)
+                if reason is not None:
+                    reasons[lgt] = reason
+            self._hass.async_create_task(self._send(commands, reasons))
+
+        if queued and platform not in self._cancel_timers:
+
+            @HA.callback
+            def drain_later(_: DT.datetime) -> None:
+                del self._cancel_timers[platform]
+                self._drain(platform)
+
+            self._cancel_timers[platform] = EV.async_call_later(
+                self._hass, bucket.seconds_until_token(), drain_later,
+            )
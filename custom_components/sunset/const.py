@@ -0,0 +1 @@
+DOMAIN = "sunset"
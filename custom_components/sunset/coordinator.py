@@ -0,0 +1,60 @@
+import asyncio
+import logging
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+
+_LOGGER = logging.getLogger("sunset")
+
+
+class TickCoordinator:
+
+    def __init__(self, tick: Callable[[], Awaitable[None]]) -> None:
+        self._tick = tick
+        self._in_flight = False
+        self._follow_up: asyncio.Future[None] | None = None
+        self.ticks_run = 0
+        self.ticks_deferred = 0
+        self.ticks_merged = 0
+
+    async def async_request_tick(self) -> None:
+        if self._in_flight:
+            await self._wait_for_follow_up()
+            return
+
+        self._in_flight = True
+        try:
+            await self._run_tick()
+            while self._follow_up is not None:
+                follow_up, self._follow_up = self._follow_up, None
+                await self._run_tick()
+                follow_up.set_result(None)
+        finally:
+            self._in_flight = False
+            if self._follow_up is not None:
+                self._follow_up.cancel()
+                self._follow_up = None
+
+    def counts(self) -> dict[str, int]:
+        return {
+            "run": self.ticks_run,
+            "deferred": self.ticks_deferred,
+            "merged": self.ticks_merged,
+        }
+
+    async def _wait_for_follow_up(self) -> None:
+        if self._follow_up is None:
+            self._follow_up = asyncio.get_running_loop().create_future()
+            self.ticks_deferred += 1
+        else:
+            self.ticks_merged += 1
+            _LOGGER.debug("Tick merged into pending follow-up, %s so far", self.ticks_merged)
+        await asyncio.shield(self._follow_up)
+
+    async def _run_tick(self) -> None:
+        self.ticks_run += 1
+        try:
+            await self._tick()
+        except Exception:
+            _LOGGER.exception("Tick failed")
@@ -0,0 +1,51 @@
+import datetime as DT
+from dataclasses import asdict, dataclass
+from enum import StrEnum
+from typing import Any
+
+
+class CommandReason(StrEnum):
+    RAMP = "ramp"
+    LIGHT_CHANGED = "light_changed"
+    STEP_CHANGE = "step_change"
+    TURN_ON = "turn_on"
+
+
+class CommandOutcome(StrEnum):
+    OK = "ok"
+    TIMEOUT = "timeout"
+    FAILED = "failed"
+
+
+@dataclass(frozen=True, slots=True)
+class CommandRecord:
+    time: DT.datetime
+    entity_id: str
+    color_temp_kelvin: int | None
+    brightness: int | None
+    reason: CommandReason | None
+    outcome: CommandOutcome
+    latency: float
+
+
+class CommandHistory:
+
+    def __init__(self, size: int) -> None:
+        self._records: list[CommandRecord | None] = [None] * size
+        self._next = 0
+
+    def record(self, record: CommandRecord) -> None:
+        if not self._records:
+            return
+        self._records[self._next] = record
+        self._next = (self._next + 1) % len(self._records)
+
+    def records(self) -> list[CommandRecord]:
+        ordered = self._records[self._next:] + self._records[:self._next]
+        return [record for record in ordered if record is not None]
+
+    def as_list(self) -> list[dict[str, Any]]:
+        return [
+            asdict(record) | {"time": record.time.isoformat()}
+            for record in self.records()
+        ]
@@ -0,0 +1,76 @@
+import inspect
+import logging
+from typing import TYPE_CHECKING, Any
+
+import homeassistant.core as HA
+from homeassistant.const import ATTR_DOMAIN, ATTR_SERVICE, EVENT_SERVICE_REGISTERED
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Mapping
+
+_LOGGER = logging.getLogger("sunset")
+
+
+def async_intercept_service(
+        hass: HA.HomeAssistant,
+        domain: str,
+        service: str,
+        amend: Callable[[Mapping[str, Any]], dict[str, Any]],
+) -> HA.CALLBACK_TYPE:
+
+    @HA.callback
+    def wrap_handler() -> None:
+        # Home Assistant has no hook to amend service calls, so the handler's
+        # job is swapped.  Give up rather than fail if these internals change.
+        services_internal = getattr(hass.services, "async_services_internal", None)
+        if not callable(services_internal):
+            warn_not_interceptable()
+            return
+
+        handler = services_internal().get(domain, {}).get(service)
+        if handler is None:
+            return
+
+        target = getattr(getattr(handler, "job", None), "target", None)
+        if not callable(target):
+            warn_not_interceptable()
+            return
+
+        async def amended_call(call: HA.ServiceCall) -> Any:
+            if attrs := amend(call.data):
+                call = HA.ServiceCall(
+                    hass,
+                    call.domain,
+                    call.service,
+                    call.data | attrs,
+                    call.context,
+                    call.return_response,
+                )
+            result = target(call)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+
+        try:
+            handler.job = HA.HassJob(amended_call, handler.job.name)
+        except (AttributeError, TypeError):
+            warn_not_interceptable()
+
+    @HA.callback
+    def warn_not_interceptable() -> None:
+        _LOGGER.warning(
+            "Cannot intercept %s.%s calls with this version of Home Assistant", domain, service,
+        )
+
+    @HA.callback
+    def is_service_registered(event_data: Mapping[str, Any]) -> bool:
+        return event_data[ATTR_DOMAIN] == domain and event_data[ATTR_SERVICE] == service
+
+    @HA.callback
+    def service_registered(_: HA.Event) -> None:
+        wrap_handler()
+
+    wrap_handler()
+    return hass.bus.async_listen(
+        EVENT_SERVICE_REGISTERED, service_registered, event_filter=is_service_registered,
+    )
@@ -0,0 +1,401 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+import homeassistant.core as HA
+from homeassistant.components.binary_sensor import (
+    DOMAIN as BINARY_SENSOR_DOMAIN,
+    BinarySensorDeviceClass,
+)
+from homeassistant.components.light import (
+    ATTR_BRIGHTNESS,
+    ATTR_COLOR_TEMP_KELVIN,
+    ATTR_MAX_COLOR_TEMP_KELVIN,
+    ATTR_MIN_COLOR_TEMP_KELVIN,
+    ATTR_SUPPORTED_COLOR_MODES,
+    COLOR_MODES_BRIGHTNESS,
+    ColorMode,
+    LightEntityFeature,
+)
+from homeassistant.const import ATTR_SUPPORTED_FEATURES, EVENT_STATE_CHANGED, STATE_ON
+from homeassistant.helpers import (
+    area_registry,
+    device_registry,
+    entity_registry,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Mapping
+
+_PRESENCE_DEVICE_CLASSES = {
+    BinarySensorDeviceClass.MOTION,
+    BinarySensorDeviceClass.OCCUPANCY,
+    BinarySensorDeviceClass.PRESENCE,
+}
+
+_CAPABILITY_ATTRIBUTES = (
+    ATTR_SUPPORTED_COLOR_MODES,
+    ATTR_SUPPORTED_FEATURES,
+    ATTR_MIN_COLOR_TEMP_KELVIN,
+    ATTR_MAX_COLOR_TEMP_KELVIN,
+)
+
+
+@dataclass(frozen=True, slots=True)
+class LightCapabilities:
+    color_temp: bool
+    dimmable: bool
+    transition: bool
+    min_color_temp_kelvin: int | None
+    max_color_temp_kelvin: int | None
+    min_color_temp_mired: int | None
+    max_color_temp_mired: int | None
+
+    @classmethod
+    def from_attributes(cls, attributes: Mapping[str, Any]) -> LightCapabilities:
+        supported_modes = attributes.get(ATTR_SUPPORTED_COLOR_MODES) or []
+        supported_features = attributes.get(ATTR_SUPPORTED_FEATURES, 0)
+        min_kelvin = attributes.get(ATTR_MIN_COLOR_TEMP_KELVIN)
+        max_kelvin = attributes.get(ATTR_MAX_COLOR_TEMP_KELVIN)
+        return cls(
+            color_temp=ColorMode.COLOR_TEMP in supported_modes,
+            dimmable=not COLOR_MODES_BRIGHTNESS.isdisjoint(supported_modes),
+            transition=bool(supported_features & LightEntityFeature.TRANSITION),
+            min_color_temp_kelvin=min_kelvin,
+            max_color_temp_kelvin=max_kelvin,
+            min_color_temp_mired=int(1e6 / max_kelvin) if max_kelvin else None,
+            max_color_temp_mired=int(1e6 / min_kelvin) if min_kelvin else None,
+        )
+
+    def color_temp_in_limits(self, color_temp: int) -> int:
+        if self.max_color_temp_kelvin is not None:
+            color_temp = min(self.max_color_temp_kelvin, color_temp)
+        if self.min_color_temp_kelvin is not None:
+            color_temp = max(self.min_color_temp_kelvin, color_temp)
+        return color_temp
+
+    def color_temp_mired_in_limits(self, color_temp_mired: int) -> int:
+        if self.min_color_temp_mired is not None:
+            color_temp_mired = max(self.min_color_temp_mired, color_temp_mired)
+        if self.max_color_temp_mired is not None:
+            color_temp_mired = min(self.max_color_temp_mired, color_temp_mired)
+        return color_temp_mired
+
+
+@dataclass(slots=True)
+class KnownState:
+    color_temp_mired: int | None
+    brightness: int | None
+    settled_color_temp_mired: int | None = None
+
+    def command_color_temp(self, color_temp_mired: int) -> None:
+        self.color_temp_mired = color_temp_mired
+        self.settled_color_temp_mired = None
+
+    def converged_color_temp_mired(
+            self, reported_mired: int | None, tolerance: int,
+    ) -> int | None:
+        if reported_mired is None or reported_mired == self.color_temp_mired:
+            return reported_mired
+
+        if (
+            self.settled_color_temp_mired is None
+            and self.color_temp_mired is not None
+            and abs(reported_mired - self.color_temp_mired) <= tolerance
+        ):
+            self.settled_color_temp_mired = reported_mired
+
+        if reported_mired == self.settled_color_temp_mired:
+            return self.color_temp_mired
+        return reported_mired
+
+
+class LightIndex:
+
+    def __init__(
+            self,
+            hass: HA.HomeAssistant,
+            on_dirty: Callable[[], None] | None = None,
+            on_turned_on: Callable[[str], None] | None = None,
+            own_context: HA.Context | None = None,
+            on_overridden: Callable[[str], None] | None = None,
+    ) -> None:
+        self._hass = hass
+        self._on_dirty = on_dirty
+        self._on_turned_on = on_turned_on
+        self._on_overridden = on_overridden
+        self._own_context = own_context
+        self._on_lights: dict[str, HA.State] = {
+            state.entity_id: state
+            for state in hass.states.async_all("light")
+            if state.state == STATE_ON
+        }
+        self._dirty: set[str] = set(self._on_lights)
+        self._changed: set[str] = set()
+        self._turned_off: set[str] = set()
+        self._color_temp_overridden: set[str] = set()
+        self._brightness_overridden: set[str] = set()
+        self._capabilities: dict[str, tuple[tuple[Any, ...], LightCapabilities]] = {}
+
+    @property
+    def on_lights(self) -> Mapping[str, HA.State]:
+        return self._on_lights
+
+    def async_start(self) -> HA.CALLBACK_TYPE:
+        unsubscribers = [
+            self._hass.bus.async_listen(
+                EVENT_STATE_CHANGED, self._state_changed, event_filter=_is_light_event,
+            ),
+            self._hass.bus.async_listen(
+                entity_registry.EVENT_ENTITY_REGISTRY_UPDATED,
+                self._registry_updated,
+                event_filter=_is_light_event,
+            ),
+        ]
+
+        @HA.callback
+        def unsubscribe() -> None:
+            for unsub in unsubscribers:
+                unsub()
+
+        return unsubscribe
+
+    def capabilities(self, lgt: str) -> LightCapabilities:
+        cached = self._capabilities.get(lgt)
+        if cached is not None:
+            return cached[1]
+
+        attributes = self._on_lights[lgt].attributes
+        capabilities = LightCapabilities.from_attributes(attributes)
+        self._capabilities[lgt] = (_capability_key(attributes), capabilities)
+        return capabilities
+
+    def color_temp_overridden(self, lgt: str) -> bool:
+        return lgt in self._color_temp_overridden
+
+    def brightness_overridden(self, lgt: str) -> bool:
+        return lgt in self._brightness_overridden
+
+    @property
+    def has_dirty(self) -> bool:
+        return bool(self._dirty)
+
+    def mark_dirty(self, lgt: str) -> None:
+        if lgt in self._on_lights:
+            self._add_dirty(lgt)
+
+    def pop_dirty(self) -> set[str]:
+        dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    def pop_changed(self) -> set[str]:
+        changed, self._changed = self._changed, set()
+        return changed
+
+    def pop_turned_off(self) -> set[str]:
+        turned_off, self._turned_off = self._turned_off, set()
+        return turned_off
+
+    @HA.callback
+    def _state_changed(self, event: HA.Event[HA.EventStateChangedData]) -> None:
+        lgt = event.data["entity_id"]
+        new_state = event.data["new_state"]
+
+        if new_state is None or new_state.state != STATE_ON:
+            if self._on_lights.pop(lgt, None) is not None:
+                self._turned_off.add(lgt)
+            self._dirty.discard(lgt)
+            self._changed.discard(lgt)
+            self._color_temp_overridden.discard(lgt)
+            self._brightness_overridden.discard(lgt)
+            return
+
+        old_state = self._on_lights.get(lgt)
+        turned_on = old_state is None
+        own = not turned_on and self._is_own(event.context)
+        if not turned_on and not own:
+            self._note_override(lgt, old_state, new_state)
+        self._on_lights[lgt] = new_state
+        if not own:
+            self._changed.add(lgt)
+            self._add_dirty(lgt)
+
+        cached = self._capabilities.get(lgt)
+        if cached is not None and cached[0] != _capability_key(new_state.attributes):
+            del self._capabilities[lgt]
+
+        if turned_on and self._on_turned_on is not None:
+            self._on_turned_on(lgt)
+
+    @HA.callback
+    def _registry_updated(
+        self, event: HA.Event[entity_registry.EventEntityRegistryUpdatedData],
+    ) -> None:
+        self._capabilities.pop(event.data["entity_id"], None)
+        if old_entity_id := event.data.get("old_entity_id"):
+            self._capabilities.pop(old_entity_id, None)
+
+    def _is_own(self, context: HA.Context) -> bool:
+        return self._own_context is not None and context.parent_id == self._own_context.id
+
+    def _note_override(self, lgt: str, old_state: HA.State, new_state: HA.State) -> None:
+        old_attrs, new_attrs = old_state.attributes, new_state.attributes
+        overridden = False
+        if old_attrs.get(ATTR_COLOR_TEMP_KELVIN) != new_attrs.get(ATTR_COLOR_TEMP_KELVIN):
+            self._color_temp_overridden.add(lgt)
+            overridden = True
+        if old_attrs.get(ATTR_BRIGHTNESS) != new_attrs.get(ATTR_BRIGHTNESS):
+            self._brightness_overridden.add(lgt)
+            overridden = True
+        if overridden and self._on_overridden is not None:
+            self._on_overridden(lgt)
+
+    def _add_dirty(self, lgt: str) -> None:
+        self._dirty.add(lgt)
+        if self._on_dirty is not None:
+            self._on_dirty()
+
+
+class LightTargets:
+
+    def __init__(self, hass: HA.HomeAssistant) -> None:
+        self._hass = hass
+        self._by_device: dict[str, set[str]] = {}
+        self._by_area: dict[str, set[str]] = {}
+        self._by_floor: dict[str, set[str]] = {}
+        self._by_label: dict[str, set[str]] = {}
+        self._presence_sensors: dict[str, set[str]] = {}
+        self._stale = True
+
+    def async_start(self) -> HA.CALLBACK_TYPE:
+        unsubscribers = [
+            self._hass.bus.async_listen(
+                entity_registry.EVENT_ENTITY_REGISTRY_UPDATED,
+                self._invalidate,
+                event_filter=_is_light_or_presence_event,
+            ),
+            self._hass.bus.async_listen(
+                device_registry.EVENT_DEVICE_REGISTRY_UPDATED, self._invalidate,
+            ),
+            self._hass.bus.async_listen(
+                area_registry.EVENT_AREA_REGISTRY_UPDATED, self._invalidate,
+            ),
+        ]
+
+        @HA.callback
+        def unsubscribe() -> None:
+            for unsub in unsubscribers:
+                unsub()
+
+        return unsubscribe
+
+    def lights_of_devices(self, device_ids: Iterable[str]) -> set[str]:
+        self._refresh()
+        return _lookup(self._by_device, device_ids)
+
+    def lights_of_areas(self, area_ids: Iterable[str]) -> set[str]:
+        self._refresh()
+        return _lookup(self._by_area, area_ids)
+
+    def lights_of_floors(self, floor_ids: Iterable[str]) -> set[str]:
+        self._refresh()
+        return _lookup(self._by_floor, floor_ids)
+
+    def lights_of_labels(self, label_ids: Iterable[str]) -> set[str]:
+        self._refresh()
+        return _lookup(self._by_label, label_ids)
+
+    def lights_in_occupied_areas(self) -> set[str]:
+        self._refresh()
+        return _lookup(self._by_area, [
+            area_id
+            for area_id, sensors in self._presence_sensors.items()
+            if any(self._hass.states.is_state(sensor, STATE_ON) for sensor in sensors)
+        ])
+
+    def _refresh(self) -> None:
+        if not self._stale:
+            return
+
+        entity_reg = entity_registry.async_get(self._hass)
+        device_reg = device_registry.async_get(self._hass)
+        area_reg = area_registry.async_get(self._hass)
+
+        by_device = defaultdict(set)
+        by_area = defaultdict(set)
+        by_floor = defaultdict(set)
+        by_label = defaultdict(set)
+        presence_sensors = defaultdict(set)
+
+        for entry in entity_reg.entities.values():
+            if entry.domain not in ("light", BINARY_SENSOR_DOMAIN):
+                continue
+            lgt = entry.entity_id
+            labels = set(entry.labels)
+            area_id = entry.area_id
+
+            device = (
+                device_reg.async_get(entry.device_id)
+                if entry.device_id is not None
+                else None
+            )
+            if device is not None:
+                area_id = area_id or device.area_id
+
+            if entry.domain == BINARY_SENSOR_DOMAIN:
+                device_class = entry.device_class or entry.original_device_class
+                if area_id is not None and device_class in _PRESENCE_DEVICE_CLASSES:
+                    presence_sensors[area_id].add(entry.entity_id)
+                continue
+
+            if device is not None:
+                by_device[device.id].add(lgt)
+                labels |= device.labels
+
+            if area_id is not None:
+                by_area[area_id].add(lgt)
+            for label_id in labels:
+                by_label[label_id].add(lgt)
+
+        for area in area_reg.async_list_areas():
+            lights = by_area.get(area.id, set())
+            if area.floor_id is not None:
+                by_floor[area.floor_id] |= lights
+            for label_id in area.labels:
+                by_label[label_id] |= lights
+
+        self._by_device = dict(by_device)
+        self._by_area = dict(by_area)
+        self._by_floor = dict(by_floor)
+        self._by_label = dict(by_label)
+        self._presence_sensors = dict(presence_sensors)
+        self._stale = False
+
+    @HA.callback
+    def _invalidate(self, _: HA.Event) -> None:
+        self._stale = True
+
+
+@HA.callback
+def _is_light_event(
+    event_data: HA.EventStateChangedData | entity_registry.EventEntityRegistryUpdatedData,
+) -> bool:
+    return event_data["entity_id"].startswith("light.")
+
+
+@HA.callback
+def _is_light_or_presence_event(
+    event_data: entity_registry.EventEntityRegistryUpdatedData,
+) -> bool:
+    return event_data["entity_id"].startswith(("light.", BINARY_SENSOR_DOMAIN + "."))
+
+
+def _lookup(index: Mapping[str, set[str]], keys: Iterable[str]) -> set[str]:
+    lights = set()
+    for key in keys:
+        lights |= index.get(key, set())
+    return lights
+
+
+def _capability_key(attributes: Mapping[str, Any]) -> tuple[Any, ...]:
+    return tuple(attributes.get(attr) for attr in _CAPABILITY_ATTRIBUTES)
@@ -0,0 +1,52 @@
+import cProfile
+import logging
+from typing import TYPE_CHECKING
+
+import homeassistant.core as HA
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+
+_LOGGER = logging.getLogger("sunset")
+
+
+class TickProfiler:
+
+    def __init__(self, hass: HA.HomeAssistant) -> None:
+        self._hass = hass
+        self._profile: cProfile.Profile | None = None
+        self._remaining = 0
+        self._path = ""
+
+    def arm(self, ticks: int, path: str) -> None:
+        self._profile = cProfile.Profile()
+        self._remaining = ticks
+        self._path = path
+
+    async def async_run(self, tick: Callable[[], Awaitable[None]]) -> None:
+        profile = self._profile
+        if profile is None or self._remaining == 0:
+            await tick()
+            return
+
+        try:
+            profile.enable()
+        except ValueError as exc:
+            _LOGGER.warning("Cannot profile the ticks: %s", exc)
+            self._remaining = 0
+            await tick()
+            return
+
+        try:
+            await tick()
+        finally:
+            profile.disable()
+
+        if profile is not self._profile:
+            return
+
+        self._remaining -= 1
+        if self._remaining == 0:
+            self._profile = None
+            await self._hass.async_add_executor_job(profile.dump_stats, self._path)
+            _LOGGER.info("Tick profile written to %s", self._path)
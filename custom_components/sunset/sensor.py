@@ -0,0 +1,172 @@
+import datetime as DT
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+import homeassistant.core as HA
+from homeassistant.components.sensor import (
+    SensorEntity,
+    SensorEntityDescription,
+    SensorStateClass,
+)
+from homeassistant.const import EntityCategory, UnitOfTime
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+
+from .const import DOMAIN
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from homeassistant.helpers.entity_platform import AddEntitiesCallback
+    from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
+
+    from .stats import Histogram, Statistics
+
+SIGNAL_SENSORS_UPDATED = DOMAIN + "_sensors_updated"
+
+ATTR_NEXT_CHANGE = "next_change"
+
+SCAN_INTERVAL = DT.timedelta(minutes=1)
+
+
+@dataclass(frozen=True, slots=True)
+class SensorValue:
+    value: int | None
+    next_change: DT.datetime | None
+
+
+async def async_setup_platform(
+        hass: HA.HomeAssistant,
+        config: ConfigType,
+        async_add_entities: AddEntitiesCallback,
+        discovery_info: DiscoveryInfoType | None = None,
+) -> None:
+    entities: list[SensorEntity] = [
+        SunsetSensor("color_temp_kelvin", "Sunset color temperature", "K"),
+        SunsetSensor("brightness", "Sunset brightness", None),
+    ]
+    if discovery_info and discovery_info.get("diagnostic_sensors"):
+        statistics = hass.data[DOMAIN]["statistics"]
+        entities.extend(
+            DiagnosticSensor(statistics, description)
+            for description in DIAGNOSTIC_SENSORS
+        )
+    async_add_entities(entities)
+
+
+class SunsetSensor(SensorEntity):
+
+    _attr_should_poll = False
+    _unrecorded_attributes = frozenset({ATTR_NEXT_CHANGE})
+
+    def __init__(self, key: str, name: str, unit: str | None) -> None:
+        self._key = key
+        self._sensor_value: SensorValue | None = None
+        self.entity_id = f"sensor.{DOMAIN}_{key}"
+        self._attr_name = name
+        self._attr_native_unit_of_measurement = unit
+
+    @property
+    def native_value(self) -> int | None:
+        if self._sensor_value is None:
+            return None
+        return self._sensor_value.value
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        if self._sensor_value is None or self._sensor_value.next_change is None:
+            return {}
+        return {ATTR_NEXT_CHANGE: self._sensor_value.next_change.isoformat()}
+
+    async def async_added_to_hass(self) -> None:
+        self.async_on_remove(
+            async_dispatcher_connect(self.hass, SIGNAL_SENSORS_UPDATED, self._update),
+        )
+        self._sensor_value = self.hass.data.get(DOMAIN, {}).get(self._key)
+
+    @HA.callback
+    def _update(self) -> None:
+        sensor_value = self.hass.data[DOMAIN].get(self._key)
+        if sensor_value == self._sensor_value:
+            return
+        self._sensor_value = sensor_value
+        self.async_write_ha_state()
+
+
+@dataclass(frozen=True, kw_only=True)
+class DiagnosticSensorDescription(SensorEntityDescription):
+    value_fn: Callable[[Statistics], float | int | None]
+    attributes_fn: Callable[[Statistics], dict[str, Any]]
+
+
+def _milliseconds(seconds: float | None) -> float | None:
+    if seconds is None:
+        return None
+    return round(seconds * 1000, 3)
+
+
+def _histogram_attributes(histogram: Histogram) -> dict[str, Any]:
+    summary = histogram.summary()
+    return {
+        "p95": _milliseconds(summary["p95"]),
+        "max": _milliseconds(summary["max"]),
+        "count": summary["count"],
+    }
+
+
+DIAGNOSTIC_SENSORS = (
+    DiagnosticSensorDescription(
+        key="tick_duration",
+        name="Sunset tick duration",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        value_fn=lambda stats: _milliseconds(stats.tick_duration.percentile(50)),
+        attributes_fn=lambda stats: _histogram_attributes(stats.tick_duration),
+    ),
+    DiagnosticSensorDescription(
+        key="command_latency",
+        name="Sunset command latency",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        value_fn=lambda stats: _milliseconds(stats.command_latency.percentile(50)),
+        attributes_fn=lambda stats: _histogram_attributes(stats.command_latency),
+    ),
+    DiagnosticSensorDescription(
+        key="lights_scanned",
+        name="Sunset lights scanned",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda stats: stats.lights_scanned,
+        attributes_fn=lambda stats: {"last_tick": stats.last_lights_scanned},
+    ),
+    DiagnosticSensorDescription(
+        key="lights_skipped",
+        name="Sunset lights skipped",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda stats: stats.lights_skipped.total(),
+        attributes_fn=lambda stats: stats.as_dict()["lights_skipped"],
+    ),
+    DiagnosticSensorDescription(
+        key="commands_sent",
+        name="Sunset commands sent",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda stats: stats.commands_sent,
+        attributes_fn=lambda stats: {"service_calls": stats.service_calls},
+    ),
+)
+
+
+class DiagnosticSensor(SensorEntity):
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(
+            self, statistics: Statistics, description: DiagnosticSensorDescription,
+    ) -> None:
+        self._statistics = statistics
+        self.entity_description = description
+        self.entity_id = f"sensor.{DOMAIN}_{description.key}"
+
+    @property
+    def native_value(self) -> float | int | None:
+        return self.entity_description.value_fn(self._statistics)
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        return self.entity_description.attributes_fn(self._statistics)
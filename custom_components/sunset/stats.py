@@ -0,0 +1,76 @@
+from collections import Counter, deque
+from enum import StrEnum
+from typing import Any
+
+
+class SkipReason(StrEnum):
+    EXCLUDED = "excluded"
+    NOT_COLOR_TEMP = "not_color_temp"
+    OVERRIDDEN = "overridden"
+    BURST_PENDING = "burst_pending"
+    RETRY_BACKOFF = "retry_backoff"
+    IN_TRANSITION = "in_transition"
+    BELOW_STEP = "below_step"
+    HYSTERESIS = "hysteresis"
+    CONVERGED = "converged"
+
+
+class Histogram:
+
+    def __init__(self, size: int = 1000) -> None:
+        self._values: deque[float] = deque(maxlen=size)
+
+    def add(self, value: float) -> None:
+        self._values.append(value)
+
+    def percentile(self, percent: float) -> float | None:
+        if not self._values:
+            return None
+        ordered = sorted(self._values)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "count": len(self._values),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "max": max(self._values, default=None),
+        }
+
+
+class Statistics:
+
+    def __init__(self) -> None:
+        self.tick_duration = Histogram()
+        self.command_latency = Histogram()
+        self.lights_scanned = 0
+        self.last_lights_scanned = 0
+        self.lights_skipped: Counter[SkipReason] = Counter()
+        self.commands_sent = 0
+        self.service_calls = 0
+
+    def record_tick(self, duration: float, lights_scanned: int) -> None:
+        self.tick_duration.add(duration)
+        self.lights_scanned += lights_scanned
+        self.last_lights_scanned = lights_scanned
+
+    def record_skip(self, reason: SkipReason) -> None:
+        self.lights_skipped[reason] += 1
+
+    def record_service_call(self, lights: int) -> None:
+        self.service_calls += 1
+        self.commands_sent += lights
+
+    def record_command_latency(self, latency: float) -> None:
+        self.command_latency.add(latency)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "tick_duration": self.tick_duration.summary(),
+            "command_latency": self.command_latency.summary(),
+            "lights_scanned": self.lights_scanned,
+            "last_lights_scanned": self.last_lights_scanned,
+            "lights_skipped": {reason.value: self.lights_skipped[reason] for reason in SkipReason},
+            "commands_sent": self.commands_sent,
+            "service_calls": self.service_calls,
+        }
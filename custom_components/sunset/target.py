@@ -0,0 +1,16 @@
+import datetime as DT
+from dataclasses import dataclass, field
+
+from .calculator import RampSegment
+
+
+@dataclass(frozen=True, slots=True)
+class Target:
+    redshift_active: bool
+    brightness_active: bool
+    color_temp: int
+    color_temp_mired: int
+    color_temp_final: bool
+    brightness: int | None
+    ramp_segment: RampSegment | None
+    time: DT.datetime = field(compare=False)
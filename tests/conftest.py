@@ -11,15 +11,18 @@ from homeassistant.components.light import (
     ATTR_MAX_COLOR_TEMP_KELVIN,
     ATTR_MIN_COLOR_TEMP_KELVIN,
     ATTR_SUPPORTED_COLOR_MODES,
+    COLOR_MODE_BRIGHTNESS,
     COLOR_MODE_COLOR_TEMP,
     COLOR_MODE_ONOFF,
     COLOR_MODE_XY,
 )
 from homeassistant.const import (
     ATTR_ENTITY_ID,
+    ATTR_SUPPORTED_FEATURES,
     SERVICE_TURN_ON,
     STATE_ON,
 )
+from homeassistant.helpers import config_validation as cv
 from homeassistant.helpers.entity_registry import EntityRegistry
 from pytest_homeassistant_custom_component.common import MockConfigEntry
 
@@ -30,6 +33,7 @@ from .const import (
     MAX_COLOR_TEMP_KELVIN,
     MIN_COLOR_TEMP_KELVIN,
 )
+from .simulation import Simulation
 
 if TYPE_CHECKING:
     from homeassistant.config_entries import ConfigEntry
@@ -37,6 +41,12 @@ if TYPE_CHECKING:
     from homeassistant.helpers.entity_registry import EntityRegistry
 
 
+@pytest.fixture(autouse=True)
+def auto_enable_custom_integrations(enable_custom_integrations):
+    """Make the sunset platforms loadable."""
+    return
+
+
 @pytest.fixture
 async def config_entry(hass: HA.HomeAssistant, device_registry: DeviceRegistry) -> ConfigEntry:
     config_entry = MockConfigEntry(domain="light")
@@ -97,14 +107,34 @@ async def dim_light(hass, entity_registry, device_registry, config_entry):
 
 
 @pytest.fixture
-def turn_on_service(hass):
-    """Mock SERVICE_TURN_ON for lights."""
+def turn_on_service_calls():
+    """Calls to SERVICE_TURN_ON as issued, possibly for many lights each."""
+    return []
+
+
+@pytest.fixture
+def turn_on_service(hass, turn_on_service_calls):
+    """Mock SERVICE_TURN_ON for lights, log one call per light."""
     light_states = {}
     calls = []
 
     @HA.callback
     def mock_service_log(call):
         """Mock service call."""
+        turn_on_service_calls.append(call)
+        for entity in cv.ensure_list(call.data[ATTR_ENTITY_ID]):
+            mock_light(
+                HA.ServiceCall(
+                    hass,
+                    call.domain,
+                    call.service,
+                    call.data | {ATTR_ENTITY_ID: entity},
+                    call.context,
+                ),
+            )
+
+    def mock_light(call):
+        """Mock the service call for a single light."""
         entity = call.data[ATTR_ENTITY_ID]
 
         last_state = light_states.get(entity)
@@ -138,19 +168,39 @@ def turn_on_service(hass):
             ATTR_BRIGHTNESS: brightness,
         }
 
-        attrs = bw_attrs if entity.startswith("light.bw") else color_tmp_attrs
+        dim_attrs = {
+            ATTR_SUPPORTED_COLOR_MODES: [COLOR_MODE_BRIGHTNESS],
+            ATTR_BRIGHTNESS: brightness,
+        }
+
+        if entity.startswith("light.bw"):
+            attrs = bw_attrs
+        elif entity.startswith("light.dim"):
+            attrs = dim_attrs
+        else:
+            attrs = color_tmp_attrs
+
+        current_state = hass.states.get(entity)
+        if current_state is not None and ATTR_SUPPORTED_FEATURES in current_state.attributes:
+            attrs[ATTR_SUPPORTED_FEATURES] = current_state.attributes[ATTR_SUPPORTED_FEATURES]
 
         light_states[entity] = attrs
         calls.append(call)
 
         attrs[ATTR_BRIGHTNESS] = min(brightness, 254)
-        hass.states.async_set(entity, STATE_ON, attrs)
+        hass.states.async_set(entity, STATE_ON, attrs, context=call.context)
 
     hass.services.async_register("light", SERVICE_TURN_ON, mock_service_log)
 
     return calls
 
 
+@pytest.fixture
+def simulation(hass, entity_registry, device_registry, config_entry, turn_on_service, start_at_noon):
+    """Replay Sunset starting at noon, see `tests/simulation.py`."""
+    return Simulation(hass, entity_registry, device_registry, config_entry, start_at_noon)
+
+
 @pytest.fixture
 def start_at_noon():
     """Fake noon time."""
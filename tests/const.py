@@ -1,5 +1,5 @@
+from custom_components.sunset.const import DOMAIN
 
-DOMAIN = "sunset"
 
 MIN_COLOR_TEMP_KELVIN = 2500
 MAX_COLOR_TEMP_KELVIN = 6250
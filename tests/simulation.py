@@ -0,0 +1,239 @@
+"""Replay a day of Sunset against a synthetic light fleet.
+
+Use the `simulation` fixture in a test and hand `report.summary()` to
+`record_property` to keep the report, e.g. to compare configurations before
+rolling them out.  It ends up in the JUnit XML written with `--junitxml`.
+
+Time advances in steps, so the convergence time is only as precise as the step.
+If tracemalloc is tracing, the report also has the peak of the memory allocated
+during the run.
+"""
+
+import datetime as DT
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+from unittest import mock
+
+import homeassistant.core as HA
+import homeassistant.helpers.event as EV
+from homeassistant.components.light import ATTR_BRIGHTNESS, ATTR_COLOR_TEMP_KELVIN
+from homeassistant.const import ATTR_ENTITY_ID, SERVICE_TURN_ON
+from homeassistant.helpers import config_validation as cv
+from homeassistant.setup import async_setup_component
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from custom_components.sunset.coordinator import TickCoordinator
+
+from .common import make_lights, turn_on_lights
+from .const import DOMAIN
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+
+    from freezegun.api import FrozenDateTimeFactory
+    from homeassistant.config_entries import ConfigEntry
+    from homeassistant.helpers.device_registry import DeviceRegistry
+    from homeassistant.helpers.entity_registry import EntityRegistry
+
+
+@dataclass(frozen=True)
+class Fleet:
+    color_temp_lights: int = 10
+    dim_lights: int = 0
+    bw_lights: int = 0
+    latencies: tuple[float, ...] = (0.0,)
+
+    def light_names(self) -> list[str]:
+        return [
+            *(f"light_{i}" for i in range(self.color_temp_lights)),
+            *(f"dimlight_{i}" for i in range(self.dim_lights)),
+            *(f"bwlight_{i}" for i in range(self.bw_lights)),
+        ]
+
+    def latency(self, index: int) -> float:
+        return self.latencies[index % len(self.latencies)]
+
+
+@dataclass
+class SimulationReport:
+    service_calls: int = 0
+    commands_per_light: Counter[str] = field(default_factory=Counter)
+    commands_per_minute: Counter[DT.datetime] = field(default_factory=Counter)
+    tick_durations: list[float] = field(default_factory=list)
+    convergence_time: DT.timedelta = DT.timedelta()
+    peak_memory: int | None = None
+
+    @property
+    def peak_commands_per_minute(self) -> int:
+        return max(self.commands_per_minute.values(), default=0)
+
+    def summary(self) -> str:
+        commands = self.commands_per_light.values()
+        ticks = self.tick_durations
+        return "\n".join([
+            f"service calls:              {self.service_calls}",
+            f"commands:                   {sum(commands)}",
+            f"commands per light (max):   {max(commands, default=0)}",
+            f"commands per minute (peak): {self.peak_commands_per_minute}",
+            f"ticks:                      {len(ticks)}",
+            f"tick CPU time (mean):       {sum(ticks) / max(len(ticks), 1) * 1e3:.3f} ms",
+            f"tick CPU time (max):        {max(ticks, default=0) * 1e3:.3f} ms",
+            f"convergence time (max):     {self.convergence_time}",
+            f"peak memory:                {self.peak_memory} B",
+        ])
+
+
+class Simulation:
+
+    def __init__(
+            self,
+            hass: HA.HomeAssistant,
+            entity_registry: EntityRegistry,
+            device_registry: DeviceRegistry,
+            config_entry: ConfigEntry,
+            frozen_time: FrozenDateTimeFactory,
+    ) -> None:
+        self._hass = hass
+        self._entity_registry = entity_registry
+        self._device_registry = device_registry
+        self._config_entry = config_entry
+        self._frozen_time = frozen_time
+        self._report = SimulationReport()
+        self._diverged_since: DT.datetime | None = None
+
+    async def async_run(
+            self,
+            fleet: Fleet,
+            config: dict | None = None,
+            start: DT.datetime | None = None,
+            duration: DT.timedelta = DT.timedelta(hours=24),
+            step: DT.timedelta = DT.timedelta(seconds=10),
+            tolerance_mired: int = 10,
+    ) -> SimulationReport:
+        lights = fleet.light_names()
+        await make_lights(
+            self._hass,
+            self._entity_registry,
+            self._device_registry,
+            self._config_entry,
+            lights,
+            area_name="simulation",
+        )
+        self._install_latency(fleet)
+
+        with mock.patch(
+            "custom_components.sunset.TickCoordinator",
+            side_effect=lambda tick: TickCoordinator(self._timed(tick)),
+        ):
+            assert await async_setup_component(self._hass, DOMAIN, {DOMAIN: config or {}})
+        await turn_on_lights(self._hass, lights)
+        await self._hass.async_block_till_done()
+
+        if start is not None:
+            self._frozen_time.move_to(start)
+            async_fire_time_changed(self._hass)
+            await self._hass.async_block_till_done()
+            self._report = SimulationReport()
+
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            baseline_memory = tracemalloc.get_traced_memory()[0]
+
+        end = DT.datetime.now() + duration
+        while DT.datetime.now() < end:
+            self._frozen_time.tick(step)
+            async_fire_time_changed(self._hass)
+            await self._hass.async_block_till_done()
+            self._check_convergence(["light." + lgt for lgt in lights], tolerance_mired)
+
+        if tracemalloc.is_tracing():
+            self._report.peak_memory = tracemalloc.get_traced_memory()[1] - baseline_memory
+
+        return self._report
+
+    def _install_latency(self, fleet: Fleet) -> None:
+        hass = self._hass
+        handler = hass.services.async_services_internal()["light"][SERVICE_TURN_ON]
+        turn_on = handler.job.target
+        latencies = {
+            "light." + lgt: fleet.latency(i) for i, lgt in enumerate(fleet.light_names())
+        }
+
+        @HA.callback
+        def delayed_turn_on(call: HA.ServiceCall) -> None:
+            self._report.service_calls += 1
+            minute = DT.datetime.now().replace(second=0, microsecond=0)
+            for entity in cv.ensure_list(call.data[ATTR_ENTITY_ID]):
+                self._report.commands_per_light[entity] += 1
+                self._report.commands_per_minute[minute] += 1
+                single_call = HA.ServiceCall(
+                    hass,
+                    call.domain,
+                    call.service,
+                    call.data | {ATTR_ENTITY_ID: [entity]},
+                    call.context,
+                )
+                latency = latencies.get(entity, 0.0)
+                if latency > 0:
+                    EV.async_call_later(
+                        hass, latency, HA.callback(lambda _, c=single_call: turn_on(c)),
+                    )
+                else:
+                    turn_on(single_call)
+
+        hass.services.async_register("light", SERVICE_TURN_ON, delayed_turn_on)
+
+    def _timed(self, tick: Callable[[], Awaitable[None]]) -> Callable[[], Awaitable[None]]:
+        async def timed_tick() -> None:
+            start = time.process_time()
+            await tick()
+            self._report.tick_durations.append(time.process_time() - start)
+
+        return timed_tick
+
+    def _check_convergence(self, lights: list[str], tolerance_mired: int) -> None:
+        now = DT.datetime.now()
+        if self._converged(lights, tolerance_mired):
+            if self._diverged_since is not None:
+                self._report.convergence_time = max(
+                    self._report.convergence_time, now - self._diverged_since,
+                )
+                self._diverged_since = None
+        elif self._diverged_since is None:
+            self._diverged_since = now
+
+    def _converged(self, lights: list[str], tolerance_mired: int) -> bool:
+        states = self._hass.states
+        target_color_temp = _number_state(states.get("sensor.sunset_color_temp_kelvin"))
+        target_brightness = _number_state(states.get("sensor.sunset_brightness"))
+        redshift_active = states.get(DOMAIN + ".redshift_active").state == "True"
+        brightness_active = states.get(DOMAIN + ".brightness_active").state == "True"
+
+        for lgt in lights:
+            attrs = states.get(lgt).attributes
+            color_temp = attrs.get(ATTR_COLOR_TEMP_KELVIN)
+            if redshift_active and color_temp is not None and target_color_temp is not None:
+                target_mired = 1e6 / _clamped(target_color_temp, attrs)
+                if abs(1e6 / color_temp - target_mired) > tolerance_mired:
+                    return False
+            brightness = attrs.get(ATTR_BRIGHTNESS)
+            if brightness_active and brightness is not None and target_brightness is not None:
+                if brightness != target_brightness:
+                    return False
+        return True
+
+
+def _number_state(state: HA.State | None) -> int | None:
+    if state is None or state.state in ("unknown", "unavailable"):
+        return None
+    return round(float(state.state))
+
+
+def _clamped(color_temp: int, attrs) -> int:
+    return min(
+        attrs.get("max_color_temp_kelvin", color_temp),
+        max(attrs.get("min_color_temp_kelvin", color_temp), color_temp),
+    )
@@ -5,8 +5,7 @@ from homeassistant.components.light import (
     COLOR_MODE_BRIGHTNESS,
 )
 from homeassistant.const import STATE_ON
-
-from custom_components.sunset import async_setup
+from homeassistant.setup import async_setup_component
 
 from .common import (
     async_fire_time_changed_now_time,
@@ -24,7 +23,7 @@ async def test_service_active_no_change(
         turn_on_service,
         start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1"])
 
@@ -44,7 +43,7 @@ async def test_service_active_no_change_two_lights(
         turn_on_service,
         start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1", "light_2"])
 
@@ -61,7 +60,7 @@ async def test_day_to_night(
         turn_on_service,
         start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
     await turn_on_lights(hass, ["light_1"])
 
     start_at_noon.move_to(some_day_time())
@@ -86,7 +85,7 @@ async def test_day_to_night_alternative_night_brightness(
         turn_on_service,
         start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {"night_brightness": 192}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {"night_brightness": 192}})
     await turn_on_lights(hass, ["light_1"])
 
     start_at_noon.move_to(some_day_time())
@@ -111,7 +110,7 @@ async def test_day_to_night_no_bed_time(
         turn_on_service,
         start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {"bed_time": "null"}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {"bed_time": "null"}})
     await turn_on_lights(hass, ["light_1"])
 
     start_at_noon.move_to(some_day_time())
@@ -136,7 +135,7 @@ async def test_day_to_night_changed_brightness_no_bed_time(
         turn_on_service,
         start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {"bed_time": "null"}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {"bed_time": "null"}})
     attrs = {
         ATTR_SUPPORTED_COLOR_MODES: [COLOR_MODE_BRIGHTNESS],
         ATTR_BRIGHTNESS: 192,
@@ -156,7 +155,7 @@ async def test_night_to_day(
         turn_on_service,
         start_at_night,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1"])
 
@@ -182,7 +181,7 @@ async def test_day_to_night_sunset_inactive(
         turn_on_service,
         start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     hass.states.async_set("sunset.redshift_active", False)
 
@@ -209,7 +208,7 @@ async def test_brightness_deactivate_with_brightness(
         turn_on_service,
         start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1", "light_2"])
     await hass.services.async_call("sunset", "deactivate_brightness", {"brightness": 192})
@@ -233,7 +232,7 @@ async def test_brightness_deactivate_no_brightness(
         turn_on_service,
         start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1", "light_2"])
     await hass.services.async_call("sunset", "deactivate_brightness", {})
@@ -250,7 +249,7 @@ async def test_day_to_night_brightness_inactive_active(
         turn_on_service,
         start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
     hass.states.async_set("sunset.brightness_active", False)
 
     await turn_on_lights(hass, ["light_1"])
@@ -288,7 +287,7 @@ async def test_override_brightness_do_not_touch_night(
         turn_on_service,
         start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1"])
 
@@ -316,7 +315,7 @@ async def test_override_brightness_do_not_touch_evening(
         turn_on_service,
         start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1"])
 
@@ -346,7 +345,7 @@ async def test_override_color_temp_do_touch(
         turn_on_service,
         start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1"])
 
@@ -377,7 +376,7 @@ async def test_override_while_active_then_reactivate(
         turn_on_service,
         start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1"])
 
@@ -421,7 +420,7 @@ async def test_brightness_bwlight(
         turn_on_service,
         start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["bwlight_1"])
 
@@ -439,7 +438,7 @@ async def test_brightness_dimlight(
         turn_on_service,
         start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["dimlight_1"])
 
@@ -457,7 +456,7 @@ async def test_brightness_go_brightness(
         turn_on_service,
         start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1", "light_2"])
     await hass.services.async_call("sunset", "deactivate_brightness", {"brightness": 192})
@@ -479,7 +478,7 @@ async def test_manual_brightness_not_intervened_by_redshift(
         turn_on_service,
         start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1"])
     start_at_noon.move_to(some_evening_time())
@@ -507,16 +506,16 @@ async def test_manual_brightness_not_intervened_by_redshift(
 
 
 async def test_global_brightness(hass, start_at_noon):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     start_at_noon.tick(600)
     async_fire_time_changed_now_time(hass)
     await hass.async_block_till_done()
 
-    assert hass.states.get("sunset.brightness").state == "254"
+    assert hass.states.get("sensor.sunset_brightness").state == "254"
 
     start_at_noon.move_to(some_night_time())
     async_fire_time_changed_now_time(hass)
     await hass.async_block_till_done()
 
-    assert hass.states.get("sunset.brightness").state == "127"
+    assert hass.states.get("sensor.sunset_brightness").state == "127"
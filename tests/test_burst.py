@@ -0,0 +1,81 @@
+import datetime as DT
+
+from custom_components.sunset.burst import BurstDispatcher
+
+from .common import async_fire_time_changed_now_time
+
+WINDOW = DT.timedelta(seconds=12)
+
+
+def make_dispatcher(hass, planned=None):
+    sent = []
+
+    async def send(lgt):
+        sent.append(lgt)
+        return planned is None or lgt in planned
+
+    return BurstDispatcher(hass, send), sent
+
+
+async def tick(hass, clock, seconds):
+    clock.tick(seconds)
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+
+async def test_burst_first_light_sent_at_once(hass, start_at_noon):
+    dispatcher, sent = make_dispatcher(hass)
+
+    await dispatcher.async_spread(["light_1", "light_2", "light_3", "light_4"], WINDOW)
+
+    assert sent == ["light_1"]
+
+    for _ in range(3):
+        await tick(hass, start_at_noon, 3)
+
+    assert sent == ["light_1", "light_2", "light_3", "light_4"]
+
+
+async def test_burst_light_pending_until_finished(hass, start_at_noon):
+    dispatcher, sent = make_dispatcher(hass)
+
+    await dispatcher.async_spread(["light_1", "light_2"], WINDOW)
+    await tick(hass, start_at_noon, 6)
+
+    assert sent == ["light_1", "light_2"]
+    assert set(dispatcher.pending) == {"light_1", "light_2"}
+
+    dispatcher.finished("light_1")
+
+    assert set(dispatcher.pending) == {"light_2"}
+
+
+async def test_burst_finished_keeps_light_not_yet_sent(hass, start_at_noon):
+    dispatcher, sent = make_dispatcher(hass)
+
+    await dispatcher.async_spread(["light_1", "light_2"], WINDOW)
+    dispatcher.finished("light_2")
+
+    assert set(dispatcher.pending) == {"light_1", "light_2"}
+
+
+async def test_burst_light_without_command_skipped(hass, start_at_noon):
+    dispatcher, sent = make_dispatcher(hass, planned={"light_3"})
+
+    await dispatcher.async_spread(["light_1", "light_2", "light_3"], WINDOW)
+
+    assert sent == ["light_1", "light_2", "light_3"]
+    assert set(dispatcher.pending) == {"light_3"}
+
+
+async def test_burst_cancel(hass, start_at_noon):
+    dispatcher, sent = make_dispatcher(hass)
+
+    await dispatcher.async_spread(["light_1", "light_2", "light_3"], WINDOW)
+
+    assert dispatcher.cancel() == ["light_1", "light_2", "light_3"]
+
+    await tick(hass, start_at_noon, 12)
+
+    assert sent == ["light_1"]
+    assert not dispatcher.pending
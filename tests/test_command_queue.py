@@ -0,0 +1,137 @@
+from homeassistant.components.light import ATTR_COLOR_TEMP_KELVIN
+
+from custom_components.sunset.command_queue import CommandQueue, Priority
+from custom_components.sunset.history import CommandReason
+
+from .common import async_fire_time_changed_now_time
+
+
+def register_lights(entity_registry, platform, count):
+    return [
+        entity_registry.async_get_or_create("light", platform, f"{platform}_{i}").entity_id
+        for i in range(count)
+    ]
+
+
+def command(lgts, color_temp=4000):
+    return {((ATTR_COLOR_TEMP_KELVIN, color_temp),): list(lgts)}
+
+
+def sent_lights(sent):
+    return [lgt for commands in sent for lgts in commands.values() for lgt in lgts]
+
+
+def make_queue(hass, rates, sent_reasons=None):
+    sent = []
+
+    async def send(commands, reasons):
+        sent.append(commands)
+        if sent_reasons is not None:
+            sent_reasons.append(dict(reasons))
+
+    return CommandQueue(hass, send, rates), sent
+
+
+async def test_queue_unlimited_platform_sent_at_once(hass, entity_registry):
+    lights = register_lights(entity_registry, "hue", 5)
+    queue, sent = make_queue(hass, {"zha": 2})
+
+    await queue.async_enqueue(command(lights))
+    await hass.async_block_till_done()
+
+    assert sent == [command(lights)]
+
+
+async def test_queue_rate_limited_per_platform(hass, entity_registry, start_at_noon):
+    zha_lights = register_lights(entity_registry, "zha", 5)
+    hue_lights = register_lights(entity_registry, "hue", 2)
+    queue, sent = make_queue(hass, {"zha": 2})
+
+    await queue.async_enqueue(command(zha_lights + hue_lights))
+    await hass.async_block_till_done()
+
+    assert set(sent_lights(sent)) == {*zha_lights[:2], *hue_lights}
+    assert queue.is_queued(zha_lights[4])
+
+    start_at_noon.tick(1)
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    assert len(sent_lights(sent)) == 6
+
+    start_at_noon.tick(1)
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    assert len(sent_lights(sent)) == 7
+    assert not queue.is_queued(zha_lights[4])
+
+
+async def test_queue_user_commands_first(hass, entity_registry, start_at_noon):
+    lights = register_lights(entity_registry, "zha", 4)
+    queue, sent = make_queue(hass, {"zha": 1})
+
+    await queue.async_enqueue(command(lights[:1]))
+    await queue.async_enqueue(command(lights[1:3]))
+    await queue.async_enqueue(command(lights[3:]), priorities={lights[3]: Priority.USER})
+    await hass.async_block_till_done()
+
+    start_at_noon.tick(1)
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    assert sent_lights(sent) == [lights[0], lights[3]]
+
+
+async def test_queue_replaces_stale_command(hass, entity_registry, start_at_noon):
+    lights = register_lights(entity_registry, "zha", 2)
+    queue, sent = make_queue(hass, {"zha": 1})
+
+    await queue.async_enqueue(command(lights, 4000))
+    await queue.async_enqueue(command(lights[1:], 3900))
+    await hass.async_block_till_done()
+
+    start_at_noon.tick(1)
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    assert sent == [command(lights[:1], 4000), command(lights[1:], 3900)]
+
+
+async def test_queue_discard(hass, entity_registry, start_at_noon):
+    lights = register_lights(entity_registry, "zha", 2)
+    queue, sent = make_queue(hass, {"zha": 1})
+
+    await queue.async_enqueue(command(lights))
+    queue.discard(lights[1])
+
+    start_at_noon.tick(1)
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    assert sent == [command(lights[:1])]
+
+
+async def test_queue_keeps_reason_of_each_command(hass, entity_registry, start_at_noon):
+    zha_lights = register_lights(entity_registry, "zha", 2)
+    hue_lights = register_lights(entity_registry, "hue", 1)
+    reasons = []
+    queue, _ = make_queue(hass, {"zha": 1}, reasons)
+
+    await queue.async_enqueue(
+        command(zha_lights + hue_lights),
+        {lgt: CommandReason.RAMP for lgt in zha_lights + hue_lights},
+    )
+    await queue.async_enqueue(command(hue_lights, 3900), {hue_lights[0]: CommandReason.TURN_ON})
+    await hass.async_block_till_done()
+
+    start_at_noon.tick(1)
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    assert reasons == [
+        {zha_lights[0]: CommandReason.RAMP},
+        {hue_lights[0]: CommandReason.RAMP},
+        {hue_lights[0]: CommandReason.TURN_ON},
+        {zha_lights[1]: CommandReason.RAMP},
+    ]
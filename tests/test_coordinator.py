@@ -0,0 +1,70 @@
+import asyncio
+
+from custom_components.sunset.coordinator import TickCoordinator
+
+
+async def test_coordinator_runs_single_tick():
+    ticks = []
+
+    async def tick():
+        ticks.append(None)
+
+    coordinator = TickCoordinator(tick)
+    await coordinator.async_request_tick()
+    await coordinator.async_request_tick()
+
+    assert len(ticks) == 2
+    assert coordinator.ticks_run == 2
+    assert coordinator.ticks_deferred == 0
+    assert coordinator.ticks_merged == 0
+
+
+async def test_coordinator_coalesces_overlapping_requests():
+    release = asyncio.Event()
+    in_flight = 0
+    max_in_flight = 0
+
+    async def tick():
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await release.wait()
+        in_flight -= 1
+
+    coordinator = TickCoordinator(tick)
+
+    requests = [asyncio.create_task(coordinator.async_request_tick()) for _ in range(4)]
+    await asyncio.sleep(0)
+
+    assert coordinator.ticks_run == 1
+
+    release.set()
+    await asyncio.gather(*requests)
+
+    assert max_in_flight == 1
+    assert coordinator.ticks_run == 2
+    assert coordinator.ticks_deferred == 1
+    assert coordinator.ticks_merged == 2
+    assert coordinator.counts() == {"run": 2, "deferred": 1, "merged": 2}
+
+
+async def test_coordinator_follow_up_after_failing_tick(caplog):
+    release = asyncio.Event()
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        ticks += 1
+        if ticks == 1:
+            await release.wait()
+            raise RuntimeError("boom")
+
+    coordinator = TickCoordinator(tick)
+
+    requests = [asyncio.create_task(coordinator.async_request_tick()) for _ in range(2)]
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(*requests)
+
+    assert ticks == 2
+    assert "Tick failed" in caplog.text
@@ -1,3 +1,5 @@
+import datetime as DT
+
 import freezegun as FG
 import pytest
 
@@ -42,3 +44,49 @@ def test_is_night_01_06(now_time, expected):
 
     with FG.freeze_time(f"2021-11-07 {now_time}:00"):
         assert calculator.is_night() == expected
+
+
+@pytest.mark.parametrize(("now", "expected"), [
+    ("2021-11-07 12:00:00", "2021-11-07 23:00:00"),
+    ("2021-11-07 23:30:00", "2021-11-08 06:00:00"),
+    ("2021-11-07 02:00:00", "2021-11-07 06:00:00"),
+])
+def test_next_change_23_06(now, expected):
+    calculator = DaytimeCalculator(
+        night_time="23:00",
+        morning_time="06:00",
+    )
+
+    with FG.freeze_time(now):
+        assert calculator.next_change() == DT.datetime.fromisoformat(expected)
+
+
+@pytest.mark.parametrize(("now", "expected"), [
+    ("2021-11-07 12:00:00", "2021-11-08 01:00:00"),
+    ("2021-11-07 00:30:00", "2021-11-07 01:00:00"),
+    ("2021-11-07 02:00:00", "2021-11-07 06:00:00"),
+])
+def test_next_change_01_06(now, expected):
+    calculator = DaytimeCalculator(
+        night_time="01:00",
+        morning_time="06:00",
+    )
+
+    with FG.freeze_time(now):
+        assert calculator.next_change() == DT.datetime.fromisoformat(expected)
+
+
+@pytest.mark.parametrize(("now", "is_night", "next_change"), [
+    ("2021-11-07 12:00:00", False, "2021-11-07 23:00:00"),
+    ("2021-11-07 23:30:00", True, "2021-11-08 06:00:00"),
+    ("2021-11-08 02:00:00", True, "2021-11-08 06:00:00"),
+])
+def test_at_given_time(now, is_night, next_change):
+    calculator = DaytimeCalculator(
+        night_time="23:00",
+        morning_time="06:00",
+    )
+    at = DT.datetime.fromisoformat(now)
+
+    assert calculator.is_night(at=at) == is_night
+    assert calculator.next_change(at=at) == DT.datetime.fromisoformat(next_change)
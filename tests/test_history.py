@@ -0,0 +1,103 @@
+import datetime as DT
+
+from homeassistant.components.light import ATTR_COLOR_TEMP_KELVIN
+from homeassistant.const import ATTR_ENTITY_ID
+from homeassistant.setup import async_setup_component
+from homeassistant.util import dt as dt_util
+
+from custom_components.sunset.history import (
+    CommandHistory,
+    CommandOutcome,
+    CommandReason,
+    CommandRecord,
+)
+
+from .common import async_fire_time_changed_now_time, some_evening_time, turn_on_lights
+from .const import DOMAIN
+
+
+def make_record(entity_id):
+    return CommandRecord(
+        time=DT.datetime(2020, 12, 13, 20, 0),
+        entity_id=entity_id,
+        color_temp_kelvin=4000,
+        brightness=None,
+        reason=CommandReason.RAMP,
+        outcome=CommandOutcome.OK,
+        latency=0.1,
+    )
+
+
+def test_history_keeps_latest_records():
+    history = CommandHistory(3)
+
+    for i in range(5):
+        history.record(make_record(f"light.light_{i}"))
+
+    assert [record.entity_id for record in history.records()] == [
+        "light.light_2", "light.light_3", "light.light_4",
+    ]
+
+
+def test_history_of_size_zero_records_nothing():
+    history = CommandHistory(0)
+
+    history.record(make_record("light.light_1"))
+
+    assert history.records() == []
+
+
+async def test_dump_history(hass, lights, turn_on_service, start_at_noon):
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
+
+    await turn_on_lights(hass, ["light_1"])
+    start_at_noon.tick(2)
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    await turn_on_lights(hass, ["light_2"])
+    start_at_noon.move_to(some_evening_time())
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    start_at_noon.tick(600)
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    response = await hass.services.async_call(
+        "sunset", "dump_history", blocking=True, return_response=True,
+    )
+
+    ramp_color_temp = int(hass.states.get("sensor.sunset_color_temp_kelvin").state)
+    commands = [
+        (command[ATTR_ENTITY_ID], command[ATTR_COLOR_TEMP_KELVIN], command["reason"])
+        for command in response["commands"]
+    ]
+    assert commands == [
+        ("light.light_1", 6250, "light_changed"),
+        ("light.light_1", 4375, "ramp"),
+        ("light.light_2", 4375, "light_changed"),
+        ("light.light_1", ramp_color_temp, "ramp"),
+        ("light.light_2", ramp_color_temp, "ramp"),
+    ]
+    assert all(command["outcome"] == "ok" for command in response["commands"])
+
+
+async def test_dump_history_records_time_of_sending(hass, lights, start_at_noon):
+    async def slow_turn_on_service(_):
+        start_at_noon.tick(5)
+
+    hass.services.async_register("light", "turn_on", slow_turn_on_service)
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
+
+    await turn_on_lights(hass, ["light_1"])
+    start_at_noon.move_to(some_evening_time())
+    sent = dt_util.now()
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    response = await hass.services.async_call(
+        "sunset", "dump_history", blocking=True, return_response=True,
+    )
+
+    assert [command["time"] for command in response["commands"]] == [sent.isoformat()]
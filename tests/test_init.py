@@ -1,13 +1,13 @@
 """Test Light Sunset setup process."""
 
 
-from custom_components.sunset import async_setup
+from homeassistant.setup import async_setup_component
 
 from .const import DOMAIN
 
 
 async def test_setup(hass):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     assert hass.states.get("sunset.redshift_active").state == "True"
     assert hass.states.get("sunset.brightness_active").state == "True"
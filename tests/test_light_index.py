@@ -0,0 +1,303 @@
+import sys
+import tracemalloc
+
+import homeassistant.core as HA
+from homeassistant.components.light import (
+    ATTR_BRIGHTNESS,
+    ATTR_COLOR_TEMP_KELVIN,
+    ATTR_SUPPORTED_COLOR_MODES,
+    ColorMode,
+)
+from homeassistant.const import STATE_OFF, STATE_ON
+
+from custom_components.sunset.lights import KnownState, LightIndex, LightTargets
+
+from .common import turn_on_lights
+from .const import MAX_COLOR_TEMP_KELVIN, MIN_COLOR_TEMP_KELVIN
+
+
+async def test_index_initially_knows_on_lights(hass, lights):
+    await turn_on_lights(hass, ["light_1"])
+
+    index = LightIndex(hass)
+
+    assert set(index.on_lights) == {"light.light_1"}
+    assert index.pop_dirty() == {"light.light_1"}
+    assert index.pop_dirty() == set()
+
+
+async def test_index_follows_lights_going_on_and_off(hass, lights):
+    index = LightIndex(hass)
+    index.async_start()
+
+    await turn_on_lights(hass, ["light_1", "light_2"])
+    await hass.async_block_till_done()
+
+    assert set(index.on_lights) == {"light.light_1", "light.light_2"}
+    assert index.pop_dirty() == {"light.light_1", "light.light_2"}
+
+    hass.states.async_set("light.light_2", STATE_OFF)
+    await hass.async_block_till_done()
+
+    assert set(index.on_lights) == {"light.light_1"}
+    assert index.pop_dirty() == set()
+    assert index.pop_turned_off() == {"light.light_2"}
+    assert index.pop_turned_off() == set()
+
+
+async def test_index_reports_lights_turned_on(hass, lights):
+    await turn_on_lights(hass, ["light_1"])
+
+    turned_on = []
+    index = LightIndex(hass, on_turned_on=turned_on.append)
+    index.async_start()
+
+    await turn_on_lights(hass, ["light_1", "light_2"], color_temp=4000)
+    await hass.async_block_till_done()
+
+    assert turned_on == ["light.light_2"]
+
+    hass.states.async_set("light.light_1", STATE_OFF)
+    await turn_on_lights(hass, ["light_1"])
+    await hass.async_block_till_done()
+
+    assert turned_on == ["light.light_2", "light.light_1"]
+
+
+async def test_index_overrides_only_from_other_contexts(hass, lights):
+    await turn_on_lights(hass, ["light_1", "light_2"], color_temp=4000)
+
+    own_context = HA.Context()
+    overridden = []
+    index = LightIndex(hass, own_context=own_context, on_overridden=overridden.append)
+    index.async_start()
+
+    state = hass.states.get("light.light_1")
+    hass.states.async_set(
+        "light.light_1",
+        STATE_ON,
+        state.attributes | {ATTR_COLOR_TEMP_KELVIN: 3000},
+        context=HA.Context(parent_id=own_context.id),
+    )
+    hass.states.async_set(
+        "light.light_2", STATE_ON, state.attributes | {ATTR_BRIGHTNESS: 100},
+    )
+    await hass.async_block_till_done()
+
+    assert not index.color_temp_overridden("light.light_1")
+    assert not index.brightness_overridden("light.light_1")
+    assert not index.color_temp_overridden("light.light_2")
+    assert index.brightness_overridden("light.light_2")
+    assert overridden == ["light.light_2"]
+
+    hass.states.async_set("light.light_2", STATE_OFF)
+    await hass.async_block_till_done()
+
+    assert not index.brightness_overridden("light.light_2")
+
+
+async def test_index_own_changes_not_dirty(hass, lights):
+    await turn_on_lights(hass, ["light_1"], color_temp=4000)
+
+    own_context = HA.Context()
+    index = LightIndex(hass, own_context=own_context)
+    index.async_start()
+    index.pop_dirty()
+
+    await turn_on_lights(hass, ["light_2"])
+    state = hass.states.get("light.light_1")
+    hass.states.async_set(
+        "light.light_1",
+        STATE_ON,
+        state.attributes | {ATTR_COLOR_TEMP_KELVIN: 3000},
+        context=HA.Context(parent_id=own_context.id),
+    )
+    await hass.async_block_till_done()
+
+    assert index.on_lights["light.light_1"].attributes[ATTR_COLOR_TEMP_KELVIN] == 3000
+    assert index.pop_dirty() == {"light.light_2"}
+    assert index.pop_changed() == {"light.light_2"}
+
+    hass.states.async_set(
+        "light.light_1", STATE_ON, state.attributes | {ATTR_BRIGHTNESS: 100},
+    )
+    index.mark_dirty("light.light_2")
+    await hass.async_block_till_done()
+
+    assert index.pop_dirty() == {"light.light_1", "light.light_2"}
+    assert index.pop_changed() == {"light.light_1"}
+
+
+async def test_index_ignores_other_domains(hass, lights):
+    index = LightIndex(hass)
+    index.async_start()
+
+    hass.states.async_set("switch.some_switch", STATE_ON)
+    await hass.async_block_till_done()
+
+    assert index.on_lights == {}
+    assert index.pop_dirty() == set()
+
+
+async def test_index_mark_dirty_only_on_lights(hass, lights):
+    await turn_on_lights(hass, ["light_1"])
+
+    index = LightIndex(hass)
+    index.pop_dirty()
+
+    index.mark_dirty("light.light_1")
+    index.mark_dirty("light.light_2")
+
+    assert index.pop_dirty() == {"light.light_1"}
+
+
+async def test_index_capabilities_of_color_temp_light(hass, lights):
+    await turn_on_lights(hass, ["light_1"])
+
+    capabilities = LightIndex(hass).capabilities("light.light_1")
+
+    assert capabilities.color_temp
+    assert capabilities.dimmable
+    assert capabilities.min_color_temp_mired == int(1e6 / MAX_COLOR_TEMP_KELVIN)
+    assert capabilities.max_color_temp_mired == int(1e6 / MIN_COLOR_TEMP_KELVIN)
+    assert capabilities.color_temp_in_limits(2000) == MIN_COLOR_TEMP_KELVIN
+    assert capabilities.color_temp_in_limits(7000) == MAX_COLOR_TEMP_KELVIN
+    assert capabilities.color_temp_in_limits(4000) == 4000
+    assert capabilities.color_temp_mired_in_limits(140) == capabilities.min_color_temp_mired
+    assert capabilities.color_temp_mired_in_limits(500) == capabilities.max_color_temp_mired
+    assert capabilities.color_temp_mired_in_limits(250) == 250
+
+
+async def test_index_capabilities_of_bw_and_dim_light(hass, bw_light, dim_light):
+    await turn_on_lights(hass, ["bwlight_1", "dimlight_1"])
+
+    index = LightIndex(hass)
+
+    assert not index.capabilities("light.bwlight_1").color_temp
+    assert not index.capabilities("light.bwlight_1").dimmable
+    assert not index.capabilities("light.dimlight_1").color_temp
+    assert index.capabilities("light.dimlight_1").dimmable
+
+
+async def test_index_capabilities_cached(hass, lights):
+    await turn_on_lights(hass, ["light_1"])
+
+    index = LightIndex(hass)
+    index.async_start()
+
+    capabilities = index.capabilities("light.light_1")
+
+    await turn_on_lights(hass, ["light_1"], color_temp=4000, brightness=100)
+    await hass.async_block_till_done()
+
+    assert index.capabilities("light.light_1") is capabilities
+
+
+async def test_index_capabilities_invalidated_by_attribute_change(hass, lights):
+    await turn_on_lights(hass, ["light_1"])
+
+    index = LightIndex(hass)
+    index.async_start()
+
+    assert index.capabilities("light.light_1").color_temp
+
+    hass.states.async_set(
+        "light.light_1",
+        STATE_ON,
+        {ATTR_SUPPORTED_COLOR_MODES: [ColorMode.BRIGHTNESS], ATTR_BRIGHTNESS: 100},
+    )
+    await hass.async_block_till_done()
+
+    assert not index.capabilities("light.light_1").color_temp
+
+
+async def test_index_capabilities_invalidated_by_registry_update(
+    hass, lights, entity_registry,
+):
+    await turn_on_lights(hass, ["light_1"])
+
+    index = LightIndex(hass)
+    index.async_start()
+
+    capabilities = index.capabilities("light.light_1")
+
+    entity_registry.async_update_entity("light.light_1", name="New name")
+    await hass.async_block_till_done()
+
+    assert index.capabilities("light.light_1") is not capabilities
+    assert index.capabilities("light.light_1") == capabilities
+
+
+async def test_targets_lights_of_devices_and_areas(
+    hass, lights, more_lights, entity_registry,
+):
+    entity_registry.async_get_or_create("switch", "", "switch_1", device_id=lights[0].device_id)
+    entity_registry.async_update_entity("switch.switch_1", area_id="area_1")
+
+    targets = LightTargets(hass)
+
+    assert targets.lights_of_devices([lights[0].device_id]) == {"light.light_1"}
+    assert targets.lights_of_areas(["area_1"]) == {"light.light_1", "light.light_2"}
+    assert targets.lights_of_areas(["area_1", "area_2", "no_area"]) == {
+        "light.light_1", "light.light_2", "light.light_3", "light.light_4",
+    }
+
+
+async def test_targets_lights_of_floors_and_labels(
+    hass, lights, more_lights, entity_registry, area_registry, floor_registry, label_registry,
+):
+    floor = floor_registry.async_create("Ground floor")
+    area_registry.async_create("Area 1", floor_id=floor.floor_id)
+    area_registry.async_create("Area 2")
+    label = label_registry.async_create("Cozy")
+    entity_registry.async_update_entity("light.light_3", labels={label.label_id})
+
+    targets = LightTargets(hass)
+
+    assert targets.lights_of_floors([floor.floor_id]) == {"light.light_1", "light.light_2"}
+    assert targets.lights_of_labels([label.label_id]) == {"light.light_3"}
+
+
+async def test_targets_follow_registry_updates(
+    hass, lights, entity_registry, device_registry,
+):
+    targets = LightTargets(hass)
+    targets.async_start()
+
+    assert targets.lights_of_areas(["area_1"]) == {"light.light_1", "light.light_2"}
+
+    entity_registry.async_update_entity("light.light_1", area_id=None)
+    device_registry.async_update_device(lights[0].device_id, area_id="area_2")
+    await hass.async_block_till_done()
+
+    assert targets.lights_of_areas(["area_1"]) == {"light.light_2"}
+    assert targets.lights_of_areas(["area_2"]) == {"light.light_1"}
+
+
+def test_known_state_memory_per_light():
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        known_states = {f"light.light_{i}": KnownState(250, 254) for i in range(1000)}
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    entity_ids_size = sum(sys.getsizeof(lgt) for lgt in known_states)
+    per_light = (after - before - entity_ids_size) / len(known_states)
+
+    assert per_light < 128
+
+
+def test_known_state_learns_settled_color_temp():
+    known_state = KnownState(None, None)
+    known_state.command_color_temp(228)
+
+    assert known_state.converged_color_temp_mired(228, 10) == 228
+    assert known_state.converged_color_temp_mired(222, 10) == 228
+    assert known_state.converged_color_temp_mired(222, 10) == 228
+    assert known_state.converged_color_temp_mired(250, 10) == 250
+
+    known_state.command_color_temp(240)
+
+    assert known_state.converged_color_temp_mired(222, 10) == 222
@@ -0,0 +1,45 @@
+import pstats
+
+import pytest
+import voluptuous as vol
+from homeassistant.setup import async_setup_component
+
+from .common import async_fire_time_changed_now_time, some_evening_time, turn_on_lights
+from .const import DOMAIN
+
+
+async def test_profile_next_ticks(hass, lights, turn_on_service, start_at_noon, tmp_path):
+    hass.config.config_dir = str(tmp_path)
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
+
+    response = await hass.services.async_call(
+        "sunset", "profile", {"ticks": 2}, blocking=True, return_response=True,
+    )
+    await turn_on_lights(hass, ["light_1", "light_2"])
+
+    start_at_noon.move_to(some_evening_time())
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    assert list(tmp_path.iterdir()) == []
+
+    start_at_noon.tick(60)
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    profile_file = tmp_path / response["path"].rsplit("/", 1)[-1]
+    assert [*tmp_path.iterdir()] == [profile_file]
+
+    stats = pstats.Stats(str(profile_file))
+    assert any(function == "timer_event" for _, _, function in stats.stats)
+
+
+@pytest.mark.parametrize("ticks", [0, -1, "many"])
+async def test_profile_rejects_invalid_ticks(hass, tmp_path, ticks):
+    hass.config.config_dir = str(tmp_path)
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
+
+    with pytest.raises(vol.Invalid):
+        await hass.services.async_call(
+            "sunset", "profile", {"ticks": ticks}, blocking=True, return_response=True,
+        )
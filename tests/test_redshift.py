@@ -1,22 +1,37 @@
+import asyncio
 import datetime as DT
+import time
+import tracemalloc
+from unittest import mock
 
+import freezegun as FG
 import pytest
 from homeassistant.components.light import (
     ATTR_BRIGHTNESS,
     ATTR_COLOR_NAME,
     ATTR_COLOR_TEMP_KELVIN,
+    ATTR_EFFECT,
     ATTR_SUPPORTED_COLOR_MODES,
+    ATTR_TRANSITION,
     COLOR_MODE_COLOR_TEMP,
+    LightEntityFeature,
 )
 from homeassistant.const import (
     ATTR_AREA_ID,
     ATTR_DEVICE_ID,
     ATTR_ENTITY_ID,
+    ATTR_FLOOR_ID,
+    ATTR_SUPPORTED_FEATURES,
     STATE_OFF,
     STATE_ON,
 )
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import event as EV
+from homeassistant.setup import async_setup_component
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
 
-from custom_components.sunset import async_setup
+from custom_components.sunset.calculator import RedshiftCalculator
 
 from .common import (
     async_fire_time_changed_now_time,
@@ -39,7 +54,7 @@ async def test_no_call_right_after_setup(
     lights,
     start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
     await hass.async_block_till_done()
 
     start_at_noon.move_to(some_day_time())
@@ -55,7 +70,7 @@ async def test_service_turn_on_call_two_lights_two_on(
     turn_on_service,
     start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1", "light_2"])
 
@@ -72,7 +87,7 @@ async def test_service_catch_rounding_error(
     turn_on_service,
     start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1"])
 
@@ -95,7 +110,7 @@ async def test_service_active_inactive(
     turn_on_service,
     start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1"])
 
@@ -130,7 +145,7 @@ async def test_light_goes_on_while_inactive(
     turn_on_service,
     start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1"])
 
@@ -183,7 +198,7 @@ async def test_override_brightness_do_touch(
     turn_on_service,
     start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1"])
 
@@ -214,7 +229,7 @@ async def test_override_while_active_then_reactivate(
     turn_on_service,
     start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1"])
 
@@ -257,7 +272,7 @@ async def test_service_turn_on_call_four_lights_four_on(
     turn_on_service,
     start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1", "light_2", "light_3", "light_4"])
 
@@ -274,7 +289,7 @@ async def test_service_turn_on_call_four_lights_1_3_on(
     turn_on_service,
     start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1", "light_3"])
 
@@ -294,7 +309,7 @@ async def test_service_turn_on_call_four_lights_3_override_color_temp(
     turn_on_service,
     start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1", "light_3"])
 
@@ -350,7 +365,7 @@ async def test_redshift_day_to_night(
     turn_on_service,
     start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1"])
 
@@ -368,7 +383,7 @@ async def test_redshift_night_to_day(
     turn_on_service,
     start_at_night,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1"])
 
@@ -387,7 +402,7 @@ async def test_redshift_bwlight(
     turn_on_service,
     start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["bwlight_1"])
 
@@ -405,7 +420,7 @@ async def test_redshift_dimlight(
     turn_on_service,
     start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["dimlight_1"])
 
@@ -423,7 +438,7 @@ async def test_redshift_light_in_color(
     turn_on_service,
     start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     attrs = {
         ATTR_COLOR_NAME: "green",
@@ -447,7 +462,7 @@ async def test_redshift_day_to_night_non_default_night_color_temp(
     start_at_noon,
 ):
     config = {"night_color_temp": 2571}
-    assert await async_setup(hass, {DOMAIN: config})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
 
     await turn_on_lights(hass, ["light_1"])
 
@@ -466,7 +481,7 @@ async def test_redshift_night_to_day_non_default_day_color_temp(
     start_at_night,
 ):
     config = {"day_color_temp": 5000}
-    assert await async_setup(hass, {DOMAIN: config})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
 
     await turn_on_lights(hass, ["light_1"])
 
@@ -486,7 +501,7 @@ async def test_redshift_to_evening(
     start_at_noon,
 ):
     config = {}
-    assert await async_setup(hass, {DOMAIN: config})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
 
     await turn_on_lights(hass, ["light_1"])
 
@@ -508,7 +523,7 @@ async def test_redshift_to_evening_non_default_evening_range(
         "evening_time": "18:00",
         "night_time": "00:00",
     }
-    assert await async_setup(hass, {DOMAIN: config})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
 
     await turn_on_lights(hass, ["light_1"])
 
@@ -537,7 +552,7 @@ async def test_redshift_night_to_day_non_default_morning_time(
     start_at_night,
 ):
     config = {"morning_time": morning_time}
-    assert await async_setup(hass, {DOMAIN: config})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
 
     await turn_on_lights(hass, ["light_1"])
 
@@ -562,7 +577,7 @@ async def test_redshift_during_evening_rounding_error(
     start_at_noon,
 ):
     config = {}
-    assert await async_setup(hass, {DOMAIN: config})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
 
     await turn_on_lights(hass, ["light_1"])
 
@@ -589,7 +604,7 @@ async def test_redshift_day_to_night_exceed_color_temp_kelvin(
     start_at_noon,
 ):
     config = {"night_color_temp": 2000}
-    assert await async_setup(hass, {DOMAIN: config})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
 
     await turn_on_lights(hass, ["light_1"])
 
@@ -608,7 +623,7 @@ async def test_redshift_night_to_day_exceed_color_temp_kelvin(
     start_at_night,
 ):
     config = {"day_color_temp": 6500}
-    assert await async_setup(hass, {DOMAIN: config})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
 
     await turn_on_lights(hass, ["light_1"])
 
@@ -627,7 +642,7 @@ async def test_redshift_no_change(
     turn_on_service,
     start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1"])
 
@@ -654,7 +669,7 @@ async def test_redshift_dont_touch(
     turn_on_service,
     start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1", "light_2"])
     await hass.services.async_call(
@@ -698,7 +713,9 @@ async def test_redshift_handle_again_key_error(
     hass,
     caplog,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
+    await hass.async_block_till_done()
+    caplog.clear()
 
     await hass.services.async_call(
         "sunset", "handle_again", {ATTR_ENTITY_ID: ["some_stupidity"]},
@@ -731,7 +748,9 @@ async def test_redshift_handle_again_no_key_error(
     hass,
     caplog,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
+    await hass.async_block_till_done()
+    caplog.clear()
 
     await hass.services.async_call(
         "sunset", "dont_touch", {ATTR_ENTITY_ID: ["some_stupidity"]},
@@ -753,7 +772,9 @@ async def test_redshift_dont_touch_entity_id_not_as_list(
     hass,
     caplog,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
+    await hass.async_block_till_done()
+    caplog.clear()
     await hass.services.async_call(
         "sunset", "dont_touch", {ATTR_ENTITY_ID: "some_stupidity"},
     )
@@ -773,7 +794,7 @@ async def test_redshift_dont_touch_devices(
     turn_on_service,
     start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     light_1, light_2 = lights[0], lights[1]
 
@@ -835,7 +856,7 @@ async def test_redshift_dont_touch_areas(
     turn_on_service,
     start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
     await turn_on_lights(hass, ["light_1", "light_2", "light_3", "light_4"])
 
     await hass.services.async_call(
@@ -892,13 +913,47 @@ async def test_redshift_dont_touch_areas(
     assert len(turn_on_service) == 0
 
 
+async def test_redshift_dont_touch_floors(
+    hass,
+    lights,
+    more_lights,
+    area_registry,
+    floor_registry,
+    turn_on_service,
+    start_at_noon,
+):
+    floor = floor_registry.async_create("Ground floor")
+    area_registry.async_create("Area 2", floor_id=floor.floor_id)
+
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
+    await turn_on_lights(hass, ["light_1", "light_2", "light_3", "light_4"])
+
+    await hass.services.async_call(
+        "sunset",
+        "dont_touch",
+        {ATTR_FLOOR_ID: [floor.floor_id]},
+    )
+    await hass.async_block_till_done()
+
+    start_at_noon.tick(600)
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    assert {
+        turn_on_service.pop().data[ATTR_ENTITY_ID],
+        turn_on_service.pop().data[ATTR_ENTITY_ID],
+    } == {"light.light_1", "light.light_2"}
+
+    assert len(turn_on_service) == 0
+
+
 async def test_redshift_deactivate_with_color_temp(
     hass,
     lights,
     turn_on_service,
     start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1", "light_2"])
     await hass.services.async_call(
@@ -924,7 +979,7 @@ async def test_redshift_deactivate_no_color_temp(
     turn_on_service,
     start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1", "light_2"])
     await hass.services.async_call("sunset", "deactivate_redshift", {})
@@ -941,7 +996,7 @@ async def test_redshift_go_redshift(
     turn_on_service,
     start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1", "light_2"])
     await hass.services.async_call(
@@ -965,7 +1020,7 @@ async def test_redshift_only_relevant_attrs_in_call(
     turn_on_service,
     start_at_night,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1"])
 
@@ -988,7 +1043,7 @@ async def test_manual_redshift_not_intervened_by_brightness(
     turn_on_service,
     start_at_noon,
 ):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     await turn_on_lights(hass, ["light_1"])
     start_at_noon.move_to(some_evening_time())
@@ -1016,16 +1071,1155 @@ async def test_manual_redshift_not_intervened_by_brightness(
 
 
 async def test_global_color_temp(hass, start_at_noon):
-    assert await async_setup(hass, {DOMAIN: {}})
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
 
     start_at_noon.tick(600)
     async_fire_time_changed_now_time(hass)
     await hass.async_block_till_done()
 
-    assert hass.states.get("sunset.color_temp_kelvin").state == "6250"
+    assert hass.states.get("sensor.sunset_color_temp_kelvin").state == "6250"
+
+    start_at_noon.move_to(some_evening_time())
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    assert hass.states.get("sensor.sunset_color_temp_kelvin").state == "4375"
+
+
+async def test_redshift_unresponsive_light_not_commanded_every_tick(
+    hass,
+    lights,
+    start_at_noon,
+):
+    calls = []
+
+    def ignoring_turn_on_service(call):
+        calls.append(call)
+
+    hass.services.async_register("light", "turn_on", ignoring_turn_on_service)
+
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
+
+    await turn_on_lights(hass, ["light_1"])
+
+    start_at_noon.tick(1)
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    assert len(calls) == 1
+
+    for _ in range(5):
+        start_at_noon.tick(1)
+        async_fire_time_changed_now_time(hass)
+        await hass.async_block_till_done()
+
+    assert len(calls) == 1
+
+
+async def test_redshift_tick_scheduled_for_evening_start(
+    hass,
+    lights,
+    turn_on_service,
+    start_at_noon,
+):
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
+
+    await turn_on_lights(hass, ["light_1"])
+
+    start_at_noon.tick(1)
+    async_fire_time_changed(hass, dt_util.utcnow())
+    await hass.async_block_till_done()
+
+    assert len(turn_on_service) == 1
+    assert turn_on_service.pop().data[ATTR_COLOR_TEMP_KELVIN] == 6250
+
+    start_at_noon.move_to("2020-12-13 16:59:00")
+    async_fire_time_changed(hass, dt_util.utcnow())
+    await hass.async_block_till_done()
+
+    assert len(turn_on_service) == 0
+
+    start_at_noon.move_to("2020-12-13 17:10:00")
+    async_fire_time_changed(hass, dt_util.utcnow())
+    await hass.async_block_till_done()
+
+    assert len(turn_on_service) == 1
+    assert turn_on_service.pop().data[ATTR_COLOR_TEMP_KELVIN] < 6250
+
+
+async def test_redshift_identical_commands_batched(
+    hass,
+    more_lights,
+    turn_on_service,
+    turn_on_service_calls,
+    start_at_noon,
+):
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
+
+    await turn_on_lights(hass, ["light_1", "light_2", "light_3", "light_4"])
+
+    start_at_noon.move_to(some_evening_time())
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    assert len(turn_on_service) == 4
+    assert len(turn_on_service_calls) == 1
+    assert set(turn_on_service_calls[0].data[ATTR_ENTITY_ID]) == {
+        "light.light_1", "light.light_2", "light.light_3", "light.light_4",
+    }
+
+
+async def test_redshift_different_commands_not_batched(
+    hass,
+    more_lights,
+    turn_on_service,
+    turn_on_service_calls,
+    start_at_noon,
+):
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
+
+    hass.states.async_set("sunset.brightness_active", False)
+    await turn_on_lights(hass, ["light_1", "light_2"])
+    await turn_on_lights(hass, ["light_3", "light_4"], brightness=128)
+
+    start_at_noon.move_to(some_evening_time())
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    assert len(turn_on_service) == 4
+    assert len(turn_on_service_calls) == 2
+    assert sorted(
+        sorted(call.data[ATTR_ENTITY_ID]) for call in turn_on_service_calls
+    ) == [
+        ["light.light_1", "light.light_2"],
+        ["light.light_3", "light.light_4"],
+    ]
+
+
+async def test_redshift_slow_light_does_not_block_others(
+    hass,
+    lights,
+    caplog,
+):
+    calls = []
+
+    async def slow_turn_on_service(call):
+        if "light.light_1" in call.data[ATTR_ENTITY_ID]:
+            await asyncio.sleep(3600)
+        calls.append(call)
+
+    hass.services.async_register("light", "turn_on", slow_turn_on_service)
+
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {"command_timeout": 0.01}})
+
+    hass.states.async_set("sunset.brightness_active", False)
+    await turn_on_lights(hass, ["light_1"], brightness=128)
+    await turn_on_lights(hass, ["light_2"], brightness=192)
+
+    await hass.services.async_call(
+        "sunset", "deactivate_redshift", {"color_temp": 2571}, blocking=True,
+    )
+    await hass.async_block_till_done()
+
+    assert [call.data[ATTR_ENTITY_ID] for call in calls] == [["light.light_2"]]
+    assert any(
+        r.levelname == "WARNING" and r.message == "Timeout turning on light.light_1"
+        for r in caplog.records
+    )
+
+
+async def _run_pending_callbacks():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.parametrize(("max_concurrent_commands", "light_2_sent"), [(8, True), (1, False)])
+async def test_redshift_slow_light_does_not_hold_up_ticks(
+    hass,
+    lights,
+    start_at_noon,
+    max_concurrent_commands,
+    light_2_sent,
+):
+    calls = []
+    release = asyncio.Event()
+
+    async def slow_turn_on_service(call):
+        calls.append(call.data[ATTR_ENTITY_ID])
+        if "light.light_1" in call.data[ATTR_ENTITY_ID]:
+            await release.wait()
+
+    hass.services.async_register("light", "turn_on", slow_turn_on_service)
+
+    config = {"max_concurrent_commands": max_concurrent_commands}
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
+
+    await turn_on_lights(hass, ["light_1"])
+    start_at_noon.move_to(some_evening_time())
+    async_fire_time_changed_now_time(hass)
+    await _run_pending_callbacks()
+
+    assert calls == [["light.light_1"]]
+
+    await turn_on_lights(hass, ["light_2"])
+    await hass.services.async_call("sunset", "activate_brightness", {}, blocking=True)
+    await _run_pending_callbacks()
+
+    assert (["light.light_2"] in calls) == light_2_sent
+
+    release.set()
+    await hass.async_block_till_done()
+
+    assert calls[-1] == ["light.light_2"]
+
+
+async def test_redshift_failing_light_does_not_block_others(
+    hass,
+    lights,
+    caplog,
+):
+    calls = []
+
+    def failing_turn_on_service(call):
+        if "light.light_1" in call.data[ATTR_ENTITY_ID]:
+            raise HomeAssistantError("unreachable")
+        calls.append(call)
+
+    hass.services.async_register("light", "turn_on", failing_turn_on_service)
+
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
+
+    hass.states.async_set("sunset.brightness_active", False)
+    await turn_on_lights(hass, ["light_1"], brightness=128)
+    await turn_on_lights(hass, ["light_2"], brightness=192)
+
+    await hass.services.async_call(
+        "sunset", "deactivate_redshift", {"color_temp": 2571}, blocking=True,
+    )
+    await hass.async_block_till_done()
+
+    assert [call.data[ATTR_ENTITY_ID] for call in calls] == [["light.light_2"]]
+    assert any(
+        r.levelname == "WARNING"
+        and r.message == "Failed to turn on light.light_1: unreachable"
+        for r in caplog.records
+    )
+
+
+async def test_redshift_failed_light_retried(
+    hass,
+    lights,
+    start_at_noon,
+):
+    calls = []
+
+    def failing_once_turn_on_service(call):
+        calls.append(call)
+        if len(calls) == 1:
+            raise HomeAssistantError("unreachable")
+
+    hass.services.async_register("light", "turn_on", failing_once_turn_on_service)
+
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
+
+    await turn_on_lights(hass, ["light_1"])
+
+    start_at_noon.move_to(some_evening_time())
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+    assert len(calls) == 1
+
+    start_at_noon.tick(2)
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    assert [call.data[ATTR_ENTITY_ID] for call in calls] == [
+        ["light.light_1"], ["light.light_1"],
+    ]
+
+
+async def test_redshift_failing_light_retried_with_backoff(
+    hass,
+    lights,
+    start_at_noon,
+    caplog,
+):
+    calls = []
+
+    def failing_turn_on_service(call):
+        calls.append(dt_util.utcnow())
+        raise HomeAssistantError("unreachable")
+
+    hass.services.async_register("light", "turn_on", failing_turn_on_service)
+
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
+
+    await turn_on_lights(hass, ["light_1"])
+
+    start_at_noon.move_to(some_evening_time())
+    for _ in range(600):
+        start_at_noon.tick(1)
+        async_fire_time_changed_now_time(hass)
+        await hass.async_block_till_done()
+
+    intervals = [(later - earlier).total_seconds() for earlier, later in zip(calls, calls[1:])]
+    assert 1 < len(calls) <= 10
+    assert intervals == sorted(intervals)
+    assert max(intervals) <= 5 * 60 + 1
+    assert len([r for r in caplog.records if r.message.startswith("Failed to turn on")]) == len(calls)
+
+
+async def test_redshift_target_computed_once_per_tick(
+    hass,
+    more_lights,
+    turn_on_service,
+    start_at_noon,
+):
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
+
+    await turn_on_lights(hass, ["light_1", "light_2", "light_3", "light_4"])
 
     start_at_noon.move_to(some_evening_time())
+    with mock.patch.object(
+        RedshiftCalculator,
+        "color_temp",
+        autospec=True,
+        side_effect=RedshiftCalculator.color_temp,
+    ) as color_temp:
+        async_fire_time_changed_now_time(hass)
+        await hass.async_block_till_done()
+
+    assert len(turn_on_service) == 4
+    assert color_temp.call_count == 1
+
+
+async def test_redshift_morning_reset_spread_over_burst_window(
+    hass,
+    lights,
+    more_lights,
+    entity_registry,
+    turn_on_service,
+    start_at_night,
+):
+    occupancy = entity_registry.async_get_or_create(
+        "binary_sensor", "test", "occupancy_2", original_device_class="occupancy",
+    )
+    entity_registry.async_update_entity(occupancy.entity_id, area_id="area_2")
+    hass.states.async_set(occupancy.entity_id, STATE_ON)
+
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {"burst_window": 12}})
+
+    await turn_on_lights(hass, ["light_1", "light_2", "light_3", "light_4"])
+
+    for _ in range(15):
+        start_at_night.tick(1)
+        async_fire_time_changed_now_time(hass)
+        await hass.async_block_till_done()
+
+    assert len(turn_on_service) == 4
+    turn_on_service.clear()
+
+    start_at_night.move_to("2020-12-13 06:00:01")
     async_fire_time_changed_now_time(hass)
     await hass.async_block_till_done()
 
-    assert hass.states.get("sunset.color_temp_kelvin").state == "4375"
+    assert len(turn_on_service) == 1
+
+    for _ in range(3):
+        start_at_night.tick(4)
+        async_fire_time_changed_now_time(hass)
+        await hass.async_block_till_done()
+
+    assert len(turn_on_service) == 4
+    assert {call.data[ATTR_ENTITY_ID] for call in turn_on_service[:2]} == {
+        "light.light_3", "light.light_4",
+    }
+    assert all(
+        call.data[ATTR_COLOR_TEMP_KELVIN] == MAX_COLOR_TEMP_KELVIN
+        for call in turn_on_service
+    )
+
+
+async def test_redshift_ramp_not_spread_over_burst_window(
+    hass,
+    lights,
+    more_lights,
+    turn_on_service,
+    turn_on_service_calls,
+    start_at_noon,
+):
+    config = {"burst_window": 60, "color_temp_step": 20}
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
+
+    await turn_on_lights(hass, ["light_1", "light_2", "light_3", "light_4"], color_temp=6250)
+    start_at_noon.move_to("2020-12-13 17:00:00")
+    for _ in range(6):
+        start_at_noon.tick(60 * 60)
+        async_fire_time_changed_now_time(hass)
+        await hass.async_block_till_done()
+
+    history = await hass.services.async_call(
+        "sunset", "dump_history", blocking=True, return_response=True,
+    )
+    reasons = [command["reason"] for command in history["commands"]]
+    assert len(reasons) >= 8
+    assert set(reasons) == {"ramp"}
+    assert all(len(call.data[ATTR_ENTITY_ID]) == 4 for call in turn_on_service_calls)
+
+
+async def test_redshift_burst_cancelled_on_deactivate(
+    hass,
+    lights,
+    more_lights,
+    turn_on_service,
+    start_at_night,
+):
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {"burst_window": 12}})
+
+    await turn_on_lights(hass, ["light_1", "light_2", "light_3", "light_4"])
+
+    for _ in range(15):
+        start_at_night.tick(1)
+        async_fire_time_changed_now_time(hass)
+        await hass.async_block_till_done()
+    turn_on_service.clear()
+
+    start_at_night.move_to("2020-12-13 06:00:01")
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    assert len(turn_on_service) == 1
+
+    await hass.services.async_call("sunset", "deactivate_redshift", {}, blocking=True)
+
+    for _ in range(3):
+        start_at_night.tick(4)
+        async_fire_time_changed_now_time(hass)
+        await hass.async_block_till_done()
+
+    first, *rest = turn_on_service
+    assert first.data[ATTR_COLOR_TEMP_KELVIN] == MAX_COLOR_TEMP_KELVIN
+    assert len(rest) == 3
+    assert all(call.data[ATTR_COLOR_TEMP_KELVIN] == 2500 for call in rest)
+
+
+async def test_redshift_burst_command_dropped_on_override(
+    hass,
+    lights,
+    more_lights,
+    turn_on_service,
+    start_at_night,
+):
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {"burst_window": 12}})
+
+    hass.states.async_set("sunset.brightness_active", False)
+    await turn_on_lights(hass, ["light_1", "light_2", "light_3", "light_4"])
+
+    for _ in range(15):
+        start_at_night.tick(1)
+        async_fire_time_changed_now_time(hass)
+        await hass.async_block_till_done()
+    turn_on_service.clear()
+
+    start_at_night.move_to("2020-12-13 06:00:01")
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    pending = {"light.light_1", "light.light_2", "light.light_3", "light.light_4"} - {
+        call.data[ATTR_ENTITY_ID] for call in turn_on_service
+    }
+    overridden = sorted(pending)[0]
+    state = hass.states.get(overridden)
+    hass.states.async_set(
+        overridden, STATE_ON, state.attributes | {ATTR_COLOR_TEMP_KELVIN: 3000},
+    )
+    await hass.async_block_till_done()
+
+    for _ in range(3):
+        start_at_night.tick(4)
+        async_fire_time_changed_now_time(hass)
+        await hass.async_block_till_done()
+
+    assert len(turn_on_service) == 3
+    assert overridden not in {call.data[ATTR_ENTITY_ID] for call in turn_on_service}
+    assert hass.states.get(overridden).attributes[ATTR_COLOR_TEMP_KELVIN] == 3000
+
+
+async def test_redshift_turn_on_fast_path(
+    hass,
+    lights,
+    turn_on_service,
+    start_at_noon,
+):
+    config = {"turn_on_fast_path": True}
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
+
+    start_at_noon.move_to(some_evening_time())
+    await turn_on_lights(hass, ["light_1"])
+    await hass.async_block_till_done()
+
+    assert len(turn_on_service) == 1
+    call = turn_on_service.pop()
+    assert call.data[ATTR_ENTITY_ID] == "light.light_1"
+    assert call.data[ATTR_COLOR_TEMP_KELVIN] == 4375
+
+    hass.states.async_set("light.light_1", STATE_OFF)
+    await turn_on_lights(hass, ["light_1"], color_temp=3000)
+    await hass.async_block_till_done()
+
+    assert turn_on_service.pop().data[ATTR_COLOR_TEMP_KELVIN] == 4375
+
+    start_at_noon.tick(1)
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    assert len(turn_on_service) == 0
+
+
+async def test_redshift_turn_on_fast_path_records_reason(
+    hass,
+    lights,
+    turn_on_service,
+    start_at_noon,
+):
+    config = {"turn_on_fast_path": True}
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
+
+    start_at_noon.move_to(some_evening_time())
+    await turn_on_lights(hass, ["light_1", "light_2"])
+    await hass.async_block_till_done()
+
+    assert sorted(call.data[ATTR_ENTITY_ID] for call in turn_on_service) == [
+        "light.light_1", "light.light_2",
+    ]
+
+    history = await hass.services.async_call(
+        "sunset", "dump_history", blocking=True, return_response=True,
+    )
+    assert {command["reason"] for command in history["commands"]} == {"turn_on"}
+
+
+async def test_redshift_turn_on_fast_path_commands_only_switched_on_light(
+    hass,
+    lights,
+    start_at_noon,
+):
+    calls = []
+    release = asyncio.Event()
+
+    async def slow_turn_on_service(call):
+        calls.append(call.data[ATTR_ENTITY_ID])
+        if "light.light_1" in call.data[ATTR_ENTITY_ID]:
+            await release.wait()
+
+    hass.services.async_register("light", "turn_on", slow_turn_on_service)
+
+    config = {"turn_on_fast_path": True, "color_temp_step": 100}
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
+    hass.states.async_set("sunset.brightness_active", False)
+
+    start_at_noon.move_to(some_evening_time())
+    await turn_on_lights(hass, ["light_3"])
+    for _ in range(2):
+        start_at_noon.tick(1)
+        async_fire_time_changed_now_time(hass)
+        await hass.async_block_till_done()
+    calls.clear()
+
+    start_at_noon.tick(10 * 60)
+    await turn_on_lights(hass, ["light_1"])
+    await _run_pending_callbacks()
+    await turn_on_lights(hass, ["light_2"])
+    await _run_pending_callbacks()
+
+    assert calls == [["light.light_1"], ["light.light_2"]]
+
+    release.set()
+    await hass.async_block_till_done()
+
+
+async def test_redshift_reason_kept_with_each_command_in_flight(
+    hass,
+    lights,
+    start_at_noon,
+):
+    release = asyncio.Event()
+    calls = []
+
+    async def slow_turn_on_service(call):
+        calls.append(call)
+        if len(calls) == 1:
+            await release.wait()
+
+    hass.services.async_register("light", "turn_on", slow_turn_on_service)
+
+    config = {"turn_on_fast_path": True}
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
+    hass.states.async_set("sunset.brightness_active", False)
+    start_at_noon.move_to(some_evening_time())
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    await turn_on_lights(hass, ["light_1"], brightness=128)
+    await _run_pending_callbacks()
+    await hass.services.async_call("sunset", "activate_brightness", {}, blocking=True)
+    await _run_pending_callbacks()
+
+    assert len(calls) == 2
+
+    release.set()
+    await hass.async_block_till_done()
+
+    history = await hass.services.async_call(
+        "sunset", "dump_history", blocking=True, return_response=True,
+    )
+    assert [command["reason"] for command in history["commands"]] == [
+        "light_changed", "turn_on",
+    ]
+
+
+async def test_redshift_turn_on_fast_path_respects_dont_touch(
+    hass,
+    lights,
+    turn_on_service,
+    start_at_noon,
+):
+    config = {"turn_on_fast_path": True}
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
+
+    await hass.services.async_call(
+        "sunset", "dont_touch", {ATTR_ENTITY_ID: ["light.light_1"]},
+    )
+    start_at_noon.move_to(some_evening_time())
+    await turn_on_lights(hass, ["light_1"])
+    await hass.async_block_till_done()
+
+    assert len(turn_on_service) == 0
+
+
+OFF_COLOR_TEMP_LIGHT = {
+    ATTR_SUPPORTED_COLOR_MODES: [COLOR_MODE_COLOR_TEMP],
+    **MINMAX_COLOR_TEMP_KELVIN,
+}
+
+
+async def test_redshift_intercept_turn_on(
+    hass,
+    lights,
+    turn_on_service,
+    start_at_noon,
+):
+    config = {"intercept_turn_on": True}
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
+    hass.states.async_set("light.light_1", STATE_OFF, OFF_COLOR_TEMP_LIGHT)
+
+    start_at_noon.move_to(some_evening_time())
+    await hass.services.async_call(
+        "light", "turn_on", {ATTR_ENTITY_ID: "light.light_1"}, blocking=True,
+    )
+    await hass.async_block_till_done()
+
+    assert len(turn_on_service) == 1
+    call = turn_on_service.pop()
+    assert call.data[ATTR_COLOR_TEMP_KELVIN] == 4375
+    assert call.data[ATTR_BRIGHTNESS] == 254
+
+    start_at_noon.tick(1)
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    assert len(turn_on_service) == 0
+
+
+async def test_redshift_intercept_turn_on_keeps_caller_attributes(
+    hass,
+    lights,
+    turn_on_service,
+    start_at_noon,
+):
+    config = {"intercept_turn_on": True}
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
+    hass.states.async_set("light.light_1", STATE_OFF, OFF_COLOR_TEMP_LIGHT)
+
+    start_at_noon.move_to(some_evening_time())
+    await hass.services.async_call(
+        "light",
+        "turn_on",
+        {ATTR_ENTITY_ID: "light.light_1", ATTR_COLOR_TEMP_KELVIN: 3000},
+        blocking=True,
+    )
+
+    call = turn_on_service.pop()
+    assert call.data[ATTR_COLOR_TEMP_KELVIN] == 3000
+    assert call.data[ATTR_BRIGHTNESS] == 254
+
+
+async def test_redshift_intercept_turn_on_keeps_effect(
+    hass,
+    lights,
+    turn_on_service,
+    turn_on_service_calls,
+    start_at_noon,
+):
+    config = {"intercept_turn_on": True}
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
+    hass.states.async_set("light.light_1", STATE_OFF, OFF_COLOR_TEMP_LIGHT)
+
+    start_at_noon.move_to(some_evening_time())
+    await hass.services.async_call(
+        "light",
+        "turn_on",
+        {ATTR_ENTITY_ID: "light.light_1", ATTR_EFFECT: "colorloop"},
+        blocking=True,
+    )
+
+    assert ATTR_COLOR_TEMP_KELVIN not in turn_on_service_calls[0].data
+    assert turn_on_service_calls[0].data[ATTR_BRIGHTNESS] == 254
+
+
+async def test_redshift_intercept_turn_on_respects_dont_touch(
+    hass,
+    lights,
+    turn_on_service,
+    turn_on_service_calls,
+    start_at_noon,
+):
+    config = {"intercept_turn_on": True}
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
+    hass.states.async_set("light.light_1", STATE_OFF, OFF_COLOR_TEMP_LIGHT)
+    hass.states.async_set("light.light_2", STATE_OFF, OFF_COLOR_TEMP_LIGHT)
+
+    await hass.services.async_call(
+        "sunset", "dont_touch", {ATTR_ENTITY_ID: ["light.light_1"]},
+    )
+    start_at_noon.move_to(some_evening_time())
+    await hass.services.async_call(
+        "light",
+        "turn_on",
+        {ATTR_ENTITY_ID: ["light.light_1", "light.light_2"], ATTR_BRIGHTNESS: 200},
+        blocking=True,
+    )
+
+    assert len(turn_on_service) == 2
+    assert all(ATTR_COLOR_TEMP_KELVIN not in call.data for call in turn_on_service_calls)
+
+
+async def test_redshift_intercept_turn_on_registered_later(
+    hass,
+    lights,
+    turn_on_service_calls,
+    start_at_noon,
+    request,
+):
+    config = {"intercept_turn_on": True}
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
+    hass.states.async_set("light.light_1", STATE_OFF, OFF_COLOR_TEMP_LIGHT)
+
+    request.getfixturevalue("turn_on_service")
+    await hass.async_block_till_done()
+
+    start_at_noon.move_to(some_evening_time())
+    await hass.services.async_call(
+        "light", "turn_on", {ATTR_ENTITY_ID: "light.light_1"}, blocking=True,
+    )
+
+    assert turn_on_service_calls[0].data[ATTR_COLOR_TEMP_KELVIN] == 4375
+
+
+async def test_redshift_intercept_turn_on_unsupported_internals(
+    hass,
+    lights,
+    turn_on_service,
+    turn_on_service_calls,
+    start_at_noon,
+    caplog,
+):
+    config = {"intercept_turn_on": True}
+    with mock.patch.object(type(hass.services), "async_services_internal", None):
+        assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
+    hass.states.async_set("light.light_1", STATE_OFF, OFF_COLOR_TEMP_LIGHT)
+
+    start_at_noon.move_to(some_evening_time())
+    await hass.services.async_call(
+        "light",
+        "turn_on",
+        {ATTR_ENTITY_ID: "light.light_1", ATTR_BRIGHTNESS: 200},
+        blocking=True,
+    )
+
+    assert ATTR_COLOR_TEMP_KELVIN not in turn_on_service_calls[0].data
+    assert any(
+        r.levelname == "WARNING"
+        and r.message == "Cannot intercept light.turn_on calls with this version of Home Assistant"
+        for r in caplog.records
+    )
+
+
+async def test_redshift_tick_does_not_accumulate_memory(
+    hass,
+    more_lights,
+    turn_on_service,
+    turn_on_service_calls,
+    start_at_noon,
+):
+    config = {"command_history_size": 8}
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
+
+    await turn_on_lights(hass, ["light_1", "light_2", "light_3", "light_4"])
+
+    start_at_noon.move_to(some_evening_time())
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+    turn_on_service.clear()
+
+    sunset_files = tracemalloc.Filter(True, "*/custom_components/sunset/*")
+
+    commands = 0
+
+    async def ticks():
+        nonlocal commands
+        for _ in range(5):
+            start_at_noon.tick(300)
+            async_fire_time_changed_now_time(hass)
+            await hass.async_block_till_done()
+            commands += len(turn_on_service)
+            turn_on_service.clear()
+            turn_on_service_calls.clear()
+
+    tracemalloc.start()
+    try:
+        await ticks()
+        before = tracemalloc.take_snapshot().filter_traces([sunset_files])
+        await ticks()
+        after = tracemalloc.take_snapshot().filter_traces([sunset_files])
+    finally:
+        tracemalloc.stop()
+
+    assert commands == 40
+
+    retained = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    assert retained < 1024
+
+
+async def test_redshift_color_temp_step(
+    hass,
+    lights,
+    turn_on_service,
+    start_at_noon,
+):
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {"color_temp_step": 10}})
+
+    await turn_on_lights(hass, ["light_1"])
+
+    start_at_noon.move_to(some_evening_time())
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    assert len(turn_on_service) == 1
+    last_mired = int(1e6 / turn_on_service.pop().data[ATTR_COLOR_TEMP_KELVIN])
+
+    commands = 0
+    for _ in range(30):
+        start_at_noon.tick(60)
+        async_fire_time_changed_now_time(hass)
+        await hass.async_block_till_done()
+        while turn_on_service:
+            mired = int(1e6 / turn_on_service.pop().data[ATTR_COLOR_TEMP_KELVIN])
+            assert mired - last_mired >= 10
+            last_mired = mired
+            commands += 1
+
+    assert 0 < commands < 5
+
+    diagnostics = await hass.services.async_call(
+        "sunset", "diagnostics", blocking=True, return_response=True,
+    )
+    assert diagnostics["lights_skipped"]["below_step"] > 0
+
+
+@pytest.mark.parametrize(("hysteresis", "reversals_expected"), [(0, True), (10, False)])
+async def test_redshift_color_temp_hysteresis(
+    hass,
+    lights,
+    start_at_noon,
+    hysteresis,
+    reversals_expected,
+):
+    commanded = []
+
+    async def overshooting_turn_on_service(call):
+        mired = int(1e6 / call.data[ATTR_COLOR_TEMP_KELVIN])
+        commanded.append(mired)
+        for entity in call.data[ATTR_ENTITY_ID]:
+            state = hass.states.get(entity)
+            hass.states.async_set(
+                entity,
+                STATE_ON,
+                state.attributes | {ATTR_COLOR_TEMP_KELVIN: int(1e6 / (mired + 8))},
+                context=call.context,
+            )
+
+    hass.services.async_register("light", "turn_on", overshooting_turn_on_service)
+
+    config = {
+        "color_temp_step": 5,
+        "color_temp_hysteresis": hysteresis,
+        "color_temp_tolerance": 0,
+    }
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
+
+    await turn_on_lights(hass, ["light_1"], color_temp=6000)
+
+    start_at_noon.move_to(some_evening_time())
+    for _ in range(30):
+        start_at_noon.tick(60)
+        async_fire_time_changed_now_time(hass)
+        await hass.async_block_till_done()
+
+    reversals = [
+        later for earlier, later in zip(commanded, commanded[1:]) if later < earlier + 8
+    ]
+    assert bool(reversals) == reversals_expected
+
+    diagnostics = await hass.services.async_call(
+        "sunset", "diagnostics", blocking=True, return_response=True,
+    )
+    assert (diagnostics["lights_skipped"]["hysteresis"] > 0) != reversals_expected
+
+
+async def test_redshift_color_temp_step_reaches_night_color_temp(
+    hass,
+    lights,
+    turn_on_service,
+    start_at_noon,
+):
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {"color_temp_step": 10}})
+
+    await turn_on_lights(hass, ["light_1"])
+
+    start_at_noon.move_to("2020-12-13 22:55:00")
+    for _ in range(10):
+        start_at_noon.tick(60)
+        async_fire_time_changed_now_time(hass)
+        await hass.async_block_till_done()
+
+    assert hass.states.get("light.light_1").attributes[ATTR_COLOR_TEMP_KELVIN] == 2500
+
+
+async def test_redshift_quantizing_light_converges(
+    hass,
+    lights,
+    turn_on_service,
+    start_at_noon,
+):
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
+
+    await turn_on_lights(hass, ["light_1"])
+
+    async def report_quantized_color_temp():
+        commanded = turn_on_service.pop().data[ATTR_COLOR_TEMP_KELVIN]
+        state = hass.states.get("light.light_1")
+        hass.states.async_set(
+            "light.light_1",
+            STATE_ON,
+            state.attributes | {ATTR_COLOR_TEMP_KELVIN: round(commanded, -2) + 100},
+        )
+        await hass.async_block_till_done()
+
+    start_at_noon.move_to(some_evening_time())
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    await report_quantized_color_temp()
+
+    for _ in range(5):
+        start_at_noon.tick(1)
+        async_fire_time_changed_now_time(hass)
+        await hass.async_block_till_done()
+
+    assert len(turn_on_service) == 0
+
+    start_at_noon.tick(600)
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    assert len(turn_on_service) == 1
+
+    await report_quantized_color_temp()
+
+    start_at_noon.tick(1)
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    assert len(turn_on_service) == 0
+
+
+async def test_redshift_own_commands_not_taken_as_override(
+    hass,
+    lights,
+    start_at_noon,
+):
+    calls = []
+
+    def clamping_turn_on_service(call):
+        calls.append(call)
+        state = hass.states.get(call.data[ATTR_ENTITY_ID][0])
+        hass.states.async_set(
+            state.entity_id,
+            STATE_ON,
+            state.attributes
+            | {ATTR_COLOR_TEMP_KELVIN: call.data[ATTR_COLOR_TEMP_KELVIN] + 500},
+            context=call.context,
+        )
+
+    hass.services.async_register("light", "turn_on", clamping_turn_on_service)
+
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
+
+    await turn_on_lights(hass, ["light_1"])
+
+    start_at_noon.move_to(some_evening_time())
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    assert len(calls) == 1
+
+    start_at_noon.tick(600)
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    assert len(calls) == 2
+
+
+async def test_redshift_ramp_transition(
+    hass,
+    lights,
+    turn_on_service,
+    start_at_noon,
+):
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {"ramp_transition": 10}})
+
+    attrs = {
+        ATTR_COLOR_TEMP_KELVIN: 2630,
+        ATTR_SUPPORTED_COLOR_MODES: [COLOR_MODE_COLOR_TEMP],
+        ATTR_SUPPORTED_FEATURES: LightEntityFeature.TRANSITION,
+        ATTR_BRIGHTNESS: 254,
+    }
+    attrs.update(MINMAX_COLOR_TEMP_KELVIN)
+    hass.states.async_set("light.light_1", STATE_ON, attrs)
+
+    start_at_noon.move_to("2020-12-13 20:00:00")
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    assert len(turn_on_service) == 1
+    call = turn_on_service.pop()
+    assert ATTR_TRANSITION not in call.data
+    assert call.data[ATTR_COLOR_TEMP_KELVIN] == 4375
+
+    start_at_noon.tick(120)
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    assert len(turn_on_service) == 1
+    call = turn_on_service.pop()
+    assert call.data[ATTR_TRANSITION] == 600
+    assert call.data[ATTR_COLOR_TEMP_KELVIN] == 4250
+
+    for _ in range(9):
+        start_at_noon.tick(60)
+        async_fire_time_changed_now_time(hass)
+        await hass.async_block_till_done()
+
+    assert len(turn_on_service) == 0
+
+    diagnostics = await hass.services.async_call(
+        "sunset", "diagnostics", blocking=True, return_response=True,
+    )
+    assert diagnostics["lights_skipped"]["in_transition"] > 0
+
+    start_at_noon.tick(60)
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    assert len(turn_on_service) == 1
+    call = turn_on_service.pop()
+    assert call.data[ATTR_TRANSITION] == 600
+    assert call.data[ATTR_COLOR_TEMP_KELVIN] == 4146
+
+
+async def test_redshift_ramp_transition_not_applied_to_brightness(
+    hass,
+    lights,
+    turn_on_service,
+    start_at_noon,
+):
+    config = {"ramp_transition": 10, "bed_time": "20:01"}
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
+
+    attrs = {
+        ATTR_COLOR_TEMP_KELVIN: 2630,
+        ATTR_SUPPORTED_COLOR_MODES: [COLOR_MODE_COLOR_TEMP],
+        ATTR_SUPPORTED_FEATURES: LightEntityFeature.TRANSITION,
+        ATTR_BRIGHTNESS: 254,
+    }
+    attrs.update(MINMAX_COLOR_TEMP_KELVIN)
+    hass.states.async_set("light.light_1", STATE_ON, attrs)
+
+    start_at_noon.move_to("2020-12-13 20:00:00")
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    start_at_noon.tick(61)
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    call = turn_on_service.pop()
+    assert call.data[ATTR_BRIGHTNESS] == 127
+    assert ATTR_TRANSITION not in call.data
+
+
+async def test_redshift_ramp_transition_unsupported(
+    hass,
+    lights,
+    turn_on_service,
+    start_at_noon,
+):
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {"ramp_transition": 10}})
+
+    await turn_on_lights(hass, ["light_1"])
+
+    start_at_noon.move_to("2020-12-13 20:00:00")
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    assert len(turn_on_service) == 1
+    call = turn_on_service.pop()
+    assert ATTR_TRANSITION not in call.data
+    assert call.data[ATTR_COLOR_TEMP_KELVIN] == 4375
+
+    start_at_noon.tick(120)
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    assert len(turn_on_service) == 1
+
+
+async def test_redshift_tick_scheduled_in_local_time_across_dst_change(hass, monkeypatch):
+    monkeypatch.setenv("TZ", "Europe/Berlin")
+    time.tzset()
+    try:
+        with (
+            FG.freeze_time("2021-03-28 00:30:00", tz_offset=1),
+            mock.patch(
+                "homeassistant.helpers.event.async_track_point_in_time",
+                wraps=EV.async_track_point_in_time,
+            ) as track_point_in_time,
+        ):
+            assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
+        scheduled = track_point_in_time.call_args.args[2].astimezone(DT.UTC)
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+    assert scheduled == DT.datetime(2021, 3, 28, 4, 0, tzinfo=DT.UTC)
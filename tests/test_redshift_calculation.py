@@ -1,3 +1,5 @@
+import datetime as DT
+
 
 
 import freezegun as FG
@@ -104,3 +106,127 @@ def test_redshift_value_evening_time_after_midnight(evening, night, now):
     )
     with FG.freeze_time(f"2020-12-13 {now}:00"):
         assert calculator.color_temp() == 4250
+
+
+@pytest.mark.parametrize(("now", "expected"), [
+    ("2020-12-13 14:00:00", "2020-12-13 17:00:00"),
+    ("2020-12-13 23:30:00", "2020-12-14 07:00:00"),
+    ("2020-12-13 03:00:00", "2020-12-13 07:00:00"),
+])
+def test_redshift_next_change_outside_evening(now, expected):
+    calculator = RedshiftCalculator(
+        evening_time="17:00",
+        night_time="23:00",
+        morning_time="07:00",
+        day_color_temp=6000,
+        night_color_temp=3000,
+    )
+    with FG.freeze_time(now):
+        assert calculator.next_change() == DT.datetime.fromisoformat(expected)
+
+
+@pytest.mark.parametrize("min_mired_step", [1, 5])
+def test_redshift_next_change_evening_mired_step(min_mired_step):
+    calculator = RedshiftCalculator(
+        evening_time="17:00",
+        night_time="23:00",
+        morning_time="07:00",
+        day_color_temp=6000,
+        night_color_temp=3000,
+    )
+    with FG.freeze_time("2020-12-13 20:00:00") as frozen_time:
+        mired = int(1e6 / calculator.color_temp())
+        next_change = calculator.next_change(min_mired_step)
+
+        frozen_time.move_to(next_change - DT.timedelta(seconds=1))
+        assert int(1e6 / calculator.color_temp()) - mired < min_mired_step
+
+        frozen_time.move_to(next_change)
+        assert int(1e6 / calculator.color_temp()) - mired == min_mired_step
+
+
+@pytest.mark.parametrize("min_mired_step", [1, 3, 10])
+def test_redshift_next_change_evening_is_first_changing_second(min_mired_step):
+    calculator = RedshiftCalculator(
+        evening_time="17:00",
+        night_time="23:00",
+        morning_time="07:00",
+        day_color_temp=6000,
+        night_color_temp=3000,
+    )
+    night = DT.datetime(2020, 12, 13, 23, 0, 0)
+    now = DT.datetime(2020, 12, 13, 17, 0, 1)
+    while now < night:
+        mired = int(1e6 / calculator.color_temp(at=now))
+        next_change = calculator.next_change(min_mired_step, at=now)
+        before = next_change - DT.timedelta(seconds=1)
+
+        assert abs(int(1e6 / calculator.color_temp(at=before)) - mired) < min_mired_step
+        if next_change < night:
+            assert abs(int(1e6 / calculator.color_temp(at=next_change)) - mired) >= min_mired_step
+        now += DT.timedelta(seconds=7)
+
+
+def test_redshift_next_change_end_of_evening():
+    calculator = RedshiftCalculator(
+        evening_time="17:00",
+        night_time="23:00",
+        morning_time="07:00",
+        day_color_temp=6000,
+        night_color_temp=3000,
+    )
+    with FG.freeze_time("2020-12-13 22:59:59"):
+        assert calculator.next_change(50) == DT.datetime(2020, 12, 13, 23, 0, 0)
+
+
+@pytest.mark.parametrize(("evening", "night", "morning"), [
+    ("17:00", "23:00", "07:00"),
+    ("23:00", "01:00", "07:00"),
+    ("21:00", "03:00", "06:00"),
+    ("18:30", "00:00", "05:45"),
+])
+def test_redshift_table_matches_computed_color_temp(evening, night, morning):
+    calculator = RedshiftCalculator(
+        evening_time=evening,
+        night_time=night,
+        morning_time=morning,
+        day_color_temp=6000,
+        night_color_temp=2500,
+    )
+    with FG.freeze_time("2020-12-13 00:00:13") as frozen_time:
+        for _ in range(24 * 60 // 7):
+            assert calculator.color_temp() == calculator._computed_color_temp()
+            frozen_time.tick(7 * 60)
+
+
+@pytest.mark.parametrize("now", [
+    "2020-12-13 03:00:00",
+    "2020-12-13 14:00:00",
+    "2020-12-13 20:00:00",
+    "2020-12-13 23:30:00",
+])
+def test_redshift_at_given_time(now):
+    calculator = RedshiftCalculator(
+        evening_time="17:00",
+        night_time="23:00",
+        morning_time="07:00",
+        day_color_temp=6000,
+        night_color_temp=3000,
+    )
+    at = DT.datetime.fromisoformat(now)
+    with FG.freeze_time(now):
+        expected = (
+            calculator.color_temp(),
+            calculator.is_day(),
+            calculator.is_night(),
+            calculator.next_change(5),
+            calculator.ramp_segment(DT.timedelta(minutes=10)),
+        )
+
+    assert (
+        calculator.color_temp(at=at),
+        calculator.is_day(at=at),
+        calculator.is_night(at=at),
+        calculator.next_change(5, at=at),
+        calculator.ramp_segment(DT.timedelta(minutes=10), at=at),
+    ) == expected
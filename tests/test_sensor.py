@@ -0,0 +1,175 @@
+import datetime as DT
+
+import homeassistant.core as HA
+from homeassistant.const import (
+    ATTR_ENTITY_ID,
+    EVENT_STATE_CHANGED,
+    EVENT_STATE_REPORTED,
+    STATE_OFF,
+)
+from homeassistant.setup import async_setup_component
+
+from .common import (
+    async_fire_time_changed_now_time,
+    some_evening_time,
+    turn_on_lights,
+)
+from .const import DOMAIN
+
+
+async def test_sensors_initial_state(hass, start_at_noon):
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
+    await hass.async_block_till_done()
+
+    color_temp = hass.states.get("sensor.sunset_color_temp_kelvin")
+    assert color_temp.state == "6250"
+    assert color_temp.attributes["unit_of_measurement"] == "K"
+    assert color_temp.attributes["next_change"] == (
+        DT.datetime(2020, 12, 13, 17, 0).astimezone().isoformat()
+    )
+
+    brightness = hass.states.get("sensor.sunset_brightness")
+    assert brightness.state == "254"
+    assert brightness.attributes["next_change"] == (
+        DT.datetime(2020, 12, 14, 0, 0).astimezone().isoformat()
+    )
+
+
+async def test_sensors_written_only_on_change(
+    hass,
+    lights,
+    turn_on_service,
+    start_at_noon,
+):
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
+    await hass.async_block_till_done()
+
+    writes = []
+
+    @HA.callback
+    def is_sunset_sensor(event_data):
+        return event_data["entity_id"].startswith("sensor.sunset")
+
+    @HA.callback
+    def record_write(event):
+        writes.append(event)
+
+    for event_type in (EVENT_STATE_CHANGED, EVENT_STATE_REPORTED):
+        hass.bus.async_listen(event_type, record_write, event_filter=is_sunset_sensor)
+
+    for _ in range(3):
+        hass.states.async_set("light.light_1", STATE_OFF)
+        await turn_on_lights(hass, ["light_1"])
+        start_at_noon.tick(2)
+        async_fire_time_changed_now_time(hass)
+        await hass.async_block_till_done()
+
+    assert len(turn_on_service) == 3
+    assert writes == []
+
+    start_at_noon.move_to(some_evening_time())
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    assert hass.states.get("sensor.sunset_color_temp_kelvin").state == "4375"
+
+
+async def test_diagnostic_sensors_off_by_default(hass, start_at_noon):
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
+    await hass.async_block_till_done()
+
+    assert hass.states.get("sensor.sunset_tick_duration") is None
+
+
+async def test_diagnostic_sensors(
+    hass,
+    lights,
+    turn_on_service,
+    start_at_noon,
+):
+    config = {"diagnostic_sensors": True}
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: config})
+    await hass.async_block_till_done()
+
+    await hass.services.async_call(
+        "sunset", "dont_touch", {ATTR_ENTITY_ID: ["light.light_2"]},
+    )
+    await turn_on_lights(hass, ["light_1", "light_2"])
+    start_at_noon.move_to(some_evening_time())
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    start_at_noon.tick(60)
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    commands_sent = hass.states.get("sensor.sunset_commands_sent")
+    assert commands_sent.state == "2"
+    assert commands_sent.attributes["service_calls"] == 2
+
+    lights_skipped = hass.states.get("sensor.sunset_lights_skipped")
+    assert lights_skipped.attributes["excluded"] >= 1
+
+    tick_duration = hass.states.get("sensor.sunset_tick_duration")
+    assert tick_duration.attributes["unit_of_measurement"] == "ms"
+    assert tick_duration.attributes["count"] >= 1
+
+
+async def test_diagnostics_service(
+    hass,
+    lights,
+    turn_on_service,
+    start_at_noon,
+):
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {}})
+
+    await turn_on_lights(hass, ["light_1", "light_2"])
+    start_at_noon.move_to(some_evening_time())
+    async_fire_time_changed_now_time(hass)
+    await hass.async_block_till_done()
+
+    diagnostics = await hass.services.async_call(
+        "sunset", "diagnostics", blocking=True, return_response=True,
+    )
+
+    assert diagnostics["commands_sent"] == 2
+    assert diagnostics["service_calls"] == 1
+    assert diagnostics["lights_scanned"] >= 2
+    assert diagnostics["tick_duration"]["count"] >= 1
+    assert diagnostics["command_latency"]["count"] == 1
+    assert diagnostics["ticks"]["run"] >= 1
+    assert set(diagnostics["ticks"]) == {"run", "deferred", "merged"}
+    assert set(diagnostics["lights_skipped"]) == {
+        "excluded",
+        "not_color_temp",
+        "overridden",
+        "burst_pending",
+        "retry_backoff",
+        "in_transition",
+        "below_step",
+        "hysteresis",
+        "converged",
+    }
+
+
+async def test_diagnostics_lights_skipped_while_burst_pending(
+    hass,
+    lights,
+    more_lights,
+    turn_on_service,
+    start_at_noon,
+):
+    assert await async_setup_component(hass, DOMAIN, {DOMAIN: {"burst_window": 600}})
+
+    await turn_on_lights(hass, ["light_1", "light_2", "light_3", "light_4"])
+    start_at_noon.move_to(some_evening_time())
+    for _ in range(5):
+        start_at_noon.tick(60)
+        async_fire_time_changed_now_time(hass)
+        await hass.async_block_till_done()
+
+    diagnostics = await hass.services.async_call(
+        "sunset", "diagnostics", blocking=True, return_response=True,
+    )
+
+    assert diagnostics["lights_skipped"]["burst_pending"] >= 1
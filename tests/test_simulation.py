@@ -0,0 +1,28 @@
+import datetime as DT
+
+from .simulation import Fleet
+
+
+async def test_simulation_full_day(simulation, record_property):
+    fleet = Fleet(color_temp_lights=8, dim_lights=2, bw_lights=2, latencies=(0.0, 3.0))
+
+    report = await simulation.async_run(fleet)
+    record_property("summary", report.summary())
+
+    assert report.service_calls > 0
+    assert set(report.commands_per_light) == {
+        *(f"light.light_{i}" for i in range(8)), "light.dimlight_0", "light.dimlight_1",
+    }
+    assert report.peak_commands_per_minute >= 10
+    assert report.tick_durations
+    assert report.convergence_time < DT.timedelta(minutes=1)
+
+
+async def test_simulation_color_temp_step_saves_commands(simulation):
+    fleet = Fleet(color_temp_lights=4)
+
+    report = await simulation.async_run(
+        fleet, {"color_temp_step": 5}, duration=DT.timedelta(hours=12),
+    )
+
+    assert max(report.commands_per_light.values()) < 150